@@ -0,0 +1,194 @@
+import os
+import io
+import csv
+import json
+import hmac
+import codecs
+import asyncio
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app import crud
+from app.storage import StorageUnavailable
+from app.catalog import MATERIAL_COLUMNS
+from app.curriculum import COURSES_BY_SEMESTER, CONTENT_TYPES
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات واجهة الأدمن =====
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "500"))
+MAX_REPORTED_ERRORS = 100
+EXPORT_CHUNK_ROWS = 500
+
+CONTENT_TYPE_IDS = {t for t, _ in CONTENT_TYPES}
+
+
+def require_admin_key(x_admin_key: str = Header(None), authorization: str = Header(None)):
+    """المفتاح في X-Admin-Key أو Authorization: Bearer <key>"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="Admin API is disabled (ADMIN_API_KEY not set)")
+    key = x_admin_key
+    if key is None and authorization and authorization.lower().startswith("bearer "):
+        key = authorization[7:].strip()
+    if not key or not hmac.compare_digest(key.encode(), ADMIN_API_KEY.encode()):
+        logger.warning("Invalid admin API key received.")
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+def require_ready():
+    """قبل انتهاء التهيئة لا يمكن استبعاد المكرر؛ الاستيراد كان سيكرر المواد في الورقة"""
+    if not crud.ready.is_set():
+        raise HTTPException(status_code=503, detail="Storage is still warming up, retry shortly",
+                            headers={"Retry-After": "5"})
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_key), Depends(require_ready)])
+
+
+# ===== قراءة الطلب سطراً سطراً =====
+async def _iter_lines(request):
+    """أسطر جسم الطلب دون تحميله كاملاً في الذاكرة"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+def _detect_format(request, fmt):
+    if fmt:
+        return fmt
+    content_type = request.headers.get("content-type", "")
+    return "csv" if "csv" in content_type else "ndjson"
+
+
+def _validate(record):
+    """تحويل السجل إلى صف مادة أو رفع ValueError بسبب الرفض"""
+    semester = str(record.get("semester") or "").strip()
+    course = str(record.get("course") or "").strip()
+    type_ = str(record.get("type") or "").strip().lower()
+    file_id = str(record.get("file_id") or "").strip()
+    created_at = str(record.get("created_at") or "").strip()
+
+    if semester not in COURSES_BY_SEMESTER:
+        raise ValueError(f"unknown semester '{semester}'")
+    if course not in COURSES_BY_SEMESTER[semester]:
+        raise ValueError(f"course '{course}' is not taught in semester {semester}")
+    if type_ not in CONTENT_TYPE_IDS:
+        raise ValueError(f"unknown type '{type_}'")
+    if not file_id:
+        raise ValueError("missing file_id")
+    return [semester, course, type_, file_id, created_at or None]
+
+
+# ========= الاستيراد =========
+@router.post("/materials/import")
+async def import_materials(request: Request, format: str = None):
+    """
+    استيراد مواد من CSV أو NDJSON (format=csv|ndjson أو حسب Content-Type)
+    CSV: صف عناوين اختياري، وإلا فالأعمدة بترتيب semester,course,type,file_id[,created_at]
+    """
+    fmt = _detect_format(request, format)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    report = {"received": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    seen = set()
+    batch = []
+    columns = None
+    created_at = datetime.utcnow().isoformat()
+
+    async def flush():
+        try:
+            added = await asyncio.to_thread(crud.add_materials, batch)
+        except StorageUnavailable as e:
+            logger.warning(f"Admin import interrupted after {report['imported']} rows: {e}")
+            raise HTTPException(status_code=503, detail={"error": str(e), **report},
+                                headers={"Retry-After": "5"})
+        report["imported"] += added
+        report["duplicates"] += len(batch) - added
+        batch.clear()
+
+    line_no = 0
+    async for line in _iter_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            if fmt == "ndjson":
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            else:
+                values = next(csv.reader([line]))
+                if columns is None:
+                    columns = MATERIAL_COLUMNS
+                    if "file_id" in [v.strip().lower() for v in values]:
+                        columns = [v.strip().lower() for v in values]
+                        continue
+                record = dict(zip(columns, values))
+            report["received"] += 1
+            row = _validate(record)
+        except ValueError as e:  # يشمل أخطاء JSON
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_no, "error": str(e)})
+            continue
+
+        marker = tuple(row[:4])
+        if marker in seen:
+            report["duplicates"] += 1
+            continue
+        seen.add(marker)
+        row[4] = row[4] or created_at
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            await flush()
+
+    if batch:
+        await flush()
+    logger.info(f"📥 Admin import: {report['imported']} imported, {report['duplicates']} duplicates, "
+                f"{report['invalid']} invalid")
+    return report
+
+
+# ========= التصدير =========
+def _export_ndjson():
+    lines = []
+    for m in crud.iter_materials():
+        lines.append(json.dumps({c: m.get(c) for c in MATERIAL_COLUMNS}, ensure_ascii=False) + "\n")
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "".join(lines)
+            lines.clear()
+    yield "".join(lines)
+
+
+def _export_csv():
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(MATERIAL_COLUMNS)
+    for i, m in enumerate(crud.iter_materials(), start=1):
+        writer.writerow([m.get(c) or "" for c in MATERIAL_COLUMNS])
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+@router.get("/materials/export")
+async def export_materials(format: str = "ndjson"):
+    """تصدير كل المواد كـ NDJSON أو CSV على دفعات"""
+    if format == "csv":
+        return StreamingResponse(_export_csv(), media_type="text/csv; charset=utf-8",
+                                 headers={"Content-Disposition": "attachment; filename=materials.csv"})
+    if format == "ndjson":
+        return StreamingResponse(_export_ndjson(), media_type="application/x-ndjson")
+    raise HTTPException(status_code=400, detail="format must be csv or ndjson")
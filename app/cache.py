@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات الكاش =====
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))               # ثواني: القيمة طازجة
+CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "300"))  # ثواني إضافية: تُقدم قديمة ويُعاد تحميلها
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+
+
+class _Flight:
+    """تحميل جارٍ لمفتاح واحد ينتظره باقي الطلبات"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ReadCache:
+    """
+    كاش قراءة محدود الحجم (LRU):
+    - القيم الفارغة ([] و None) تُخزن أيضاً
+    - تحميل واحد فقط لكل مفتاح مهما كان عدد الطلبات المتزامنة
+    - بعد انتهاء ttl تُقدم القيمة القديمة ويُعاد التحميل في الخلفية (stale-while-revalidate)
+    """
+
+    def __init__(self, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, max_size=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()  # key -> (value, stored_at)
+        self._flights = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0,
+                         "loads": 0, "load_errors": 0, "evictions": 0}
+
+    # ===== القراءة =====
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self.counters["hits"] += 1
+                    self._entries.move_to_end(key)
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self.counters["stale_hits"] += 1
+                    self._entries.move_to_end(key)
+                    flight, leader = self._join(key)
+                    if leader:
+                        threading.Thread(target=self._load, args=(key, loader, flight),
+                                         name="cache-refresh", daemon=True).start()
+                    return value
+
+            self.counters["misses"] += 1
+            flight, leader = self._join(key)
+
+        if leader:
+            self._load(key, loader, flight)
+        else:
+            flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _join(self, key):
+        """الانضمام لتحميل جارٍ أو بدء تحميل جديد (يُستدعى داخل القفل)"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = self._flights[key] = _Flight()
+        return flight, True
+
+    def _load(self, key, loader, flight):
+        with self._lock:
+            generation = self._generation
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            logger.error(f"❌ فشل تحميل {key}: {e}")
+        with self._lock:
+            self.counters["loads"] += 1
+            if flight.error is not None:
+                self.counters["load_errors"] += 1
+                # قيمة قديمة متاحة؟ نبقيها بدل إظهار الخطأ
+                entry = self._entries.get(key)
+                if entry is not None:
+                    flight.value, flight.error = entry[0], None
+            elif generation == self._generation:
+                # لا نخزن نتيجة بدأت قبل آخر invalidate
+                self._store(key, flight.value)
+            self._flights.pop(key, None)
+        flight.event.set()
+
+    def _store(self, key, value):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    # ===== الإبطال =====
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    # ===== الإحصائيات =====
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["size"] = len(self._entries)
+        served = counters["hits"] + counters["stale_hits"]
+        total = served + counters["misses"]
+        counters["hit_ratio"] = served / total if total else 0.0
+        return counters
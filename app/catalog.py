@@ -0,0 +1,152 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ترتيب الأعمدة في ورقة materials (يثبّته init_db)
+MATERIAL_COLUMNS = ["semester", "course", "type", "file_id", "created_at"]
+
+# أول صف بيانات بعد صف العناوين
+FIRST_DATA_ROW = 2
+
+
+def _key(semester, course, type_):
+    return (str(semester), str(course), str(type_))
+
+
+def _marker(material):
+    return (_key(material["semester"], material["course"], material["type"]), str(material["file_id"]))
+
+
+def _material(row):
+    return dict(zip(MATERIAL_COLUMNS, list(row) + [""] * len(MATERIAL_COLUMNS)))
+
+
+class MaterialsCatalog:
+    """
+    فهرس المواد داخل الذاكرة، مفتاحه (semester, course, type)
+    loader(start_row): دالة تعيد صفوف الورقة ابتداءً من الصف start_row حتى النهاية
+    pending(): صفوف لم تُكتب في الورقة بعد (تُعاد إضافتها عند إعادة البناء)
+    """
+
+    def __init__(self, loader, refresh_interval=60, pending=None):
+        self._loader = loader
+        self._pending = pending
+        self.refresh_interval = refresh_interval
+        self._index = {}          # key -> [material, ...]
+        self._seen = set()        # (key, file_id) لمنع التكرار
+        self._unsynced = set()    # مواد في الفهرس لم تُقرأ من الورقة بعد (pending أو add)
+        self._next_row = FIRST_DATA_ROW
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    # ===== القراءة =====
+    def lookup(self, semester, course, type_):
+        """إرجاع نسخة من مواد المفتاح المطلوب"""
+        with self._lock:
+            return [dict(m) for m in self._index.get(_key(semester, course, type_), [])]
+
+    def iter_materials(self):
+        """جميع المواد مفتاحاً بعد مفتاح (بدون نسخ الفهرس كاملاً دفعة واحدة)"""
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            with self._lock:
+                items = [dict(m) for m in self._index.get(key, [])]
+            yield from items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._seen)
+
+    def in_sheet(self, semester, course, type_, file_id):
+        """هل قُرئت المادة من الورقة نفسها (وليس من الصفوف المعلقة)؟"""
+        marker = (_key(semester, course, type_), str(file_id))
+        with self._lock:
+            return marker in self._seen and marker not in self._unsynced
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def is_stale(self, max_age=None):
+        max_age = self.refresh_interval if max_age is None else max_age
+        return not self._loaded or (time.time() - self._last_refresh) >= max_age
+
+    # ===== الكتابة =====
+    def add(self, semester, course, type_, file_id, created_at=None):
+        """إضافة مادة للفهرس مباشرة (بعد كتابتها في الورقة)"""
+        material = {
+            "semester": semester, "course": course, "type": type_,
+            "file_id": file_id, "created_at": created_at,
+        }
+        with self._lock:
+            if not self._insert(material):
+                return False
+            self._unsynced.add(_marker(material))
+            return True
+
+    def _insert(self, material):
+        marker = _marker(material)
+        if not material["file_id"] or marker in self._seen:
+            return False
+        self._seen.add(marker)
+        self._index.setdefault(marker[0], []).append(material)
+        return True
+
+    # ===== التحديث =====
+    def ensure_fresh(self, max_age=None):
+        """تحديث تزايدي فقط إذا انتهت صلاحية الفهرس (تحديث واحد مهما كثرت الطلبات)"""
+        if not self.is_stale(max_age):
+            return
+        with self._refresh_lock:
+            # ربما أنهى طلب آخر التحديث أثناء انتظارنا
+            if self.is_stale(max_age):
+                self._refresh(False)
+
+    def refresh(self, full=False):
+        """
+        قراءة الصفوف المضافة بعد آخر صف معروف فقط
+        full=True: إعادة بناء الفهرس من الصفر
+        """
+        with self._refresh_lock:
+            return self._refresh(full)
+
+    def _refresh(self, full):
+        start = FIRST_DATA_ROW if (full or not self._loaded) else self._next_row
+        try:
+            rows = self._loader(start)
+        except Exception as e:
+            logger.error(f"❌ خطأ أثناء تحديث فهرس المواد: {e}")
+            return False
+
+        # gspread يعيد [[]] للنطاق الفارغ: الصفوف الفارغة في النهاية ليست صفوفاً مقروءة
+        rows = list(rows)
+        while rows and not any(str(v).strip() for v in rows[-1]):
+            rows.pop()
+
+        with self._lock:
+            # الصفوف الفارغة في الوسط تشغل مكانها في الورقة أيضاً
+            self._next_row = start + len(rows)
+            pending = []
+            if start == FIRST_DATA_ROW:
+                self._index = {}
+                self._seen = set()
+                self._unsynced = set()
+                if self._pending is not None:
+                    pending = list(self._pending())
+            for row in rows:
+                material = _material(row)
+                self._insert(material)
+                self._unsynced.discard(_marker(material))
+            # الصفوف المعلقة تظهر في الفهرس لكنها تبقى "غير موجودة في الورقة"
+            for row in pending:
+                material = _material(row)
+                if self._insert(material):
+                    self._unsynced.add(_marker(material))
+            self._loaded = True
+            self._last_refresh = time.time()
+        return True
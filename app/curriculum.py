@@ -0,0 +1,35 @@
+# ========= جدول المقررات =========
+# كل القوائم (السمسترات، المقررات، أنواع المحتوى) تُبنى من هذا الجدول
+# لإضافة مقرر جديد يكفي تعديل هذا الملف
+
+SEMESTERS = [
+    {"id": "1", "label": "الفصل الأول 1️⃣", "courses": ["Anatomy", "Histology", "Embryology"]},
+    {"id": "2", "label": "الفصل الثاني 2️⃣", "courses": ["Anatomy", "Physiology", "Biochemistry"]},
+    {"id": "3", "label": "الفصل الثالث 3️⃣", "courses": ["Pathology", "Pharmacology", "Microbiology"]},
+    {"id": "4", "label": "الفصل الرابع 4️⃣", "courses": ["Pathology", "Pharmacology", "Parasitology"]},
+    {"id": "5", "label": "الفصل الخامس 5️⃣", "courses": ["Medicine", "Surgery", "Pediatrics"]},
+]
+
+# (type, نص الزر بعد اسم المقرر)
+CONTENT_TYPES = [
+    ("pdf", "📄 PDF"),
+    ("video", "🎥 فيديو"),
+    ("reference", "📚 مرجع"),
+]
+
+# ========= جداول مشتقة (تُحسب مرة واحدة) =========
+SEMESTER_BY_LABEL = {s["label"]: s["id"] for s in SEMESTERS}
+COURSES_BY_SEMESTER = {s["id"]: list(s["courses"]) for s in SEMESTERS}
+ALL_COURSES = list(dict.fromkeys(c for s in SEMESTERS for c in s["courses"]))
+
+
+def type_button(course, type_):
+    return f"{course} {dict(CONTENT_TYPES)[type_]}"
+
+
+# نص الزر -> (course, type)
+TYPE_BY_BUTTON = {
+    type_button(course, type_): (course, type_)
+    for course in ALL_COURSES
+    for type_, _ in CONTENT_TYPES
+}
@@ -0,0 +1,85 @@
+import os
+import asyncio
+import logging
+from app.scheduler import BULK
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات إرسال المواد =====
+# album: تجميع الملفات في ألبومات sendMediaGroup (حتى 10 عناصر)
+# single: ملف واحد لكل طلب
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "album")
+ALBUM_SIZE = 10
+
+# مراجع للمهام الخلفية حتى لا يحذفها جامع القمامة
+_tasks = set()
+
+
+def pending_deliveries():
+    """عدد عمليات الإرسال الجارية في الخلفية"""
+    return len(_tasks)
+
+
+def media_kind(content_type):
+    """تلجرام لا يسمح بخلط المستندات والفيديو في ألبوم واحد"""
+    return "video" if content_type == "video" else "document"
+
+
+def send_single(scheduler, chat_id, file_id, kind="document"):
+    """جدولة إرسال ملف واحد بأولوية منخفضة"""
+    if kind == "video":
+        return scheduler.submit("sendVideo", {"chat_id": chat_id, "video": file_id}, priority=BULK)
+    return scheduler.submit("sendDocument", {"chat_id": chat_id, "document": file_id}, priority=BULK)
+
+
+def build_albums(materials, content_type):
+    """تقسيم المواد إلى ألبومات متجانسة: [(kind, [file_id, ...]), ...]"""
+    groups = {}
+    for m in materials:
+        file_id = m.get("file_id")
+        if file_id:
+            kind = media_kind(m.get("type") or content_type)
+            groups.setdefault(kind, []).append(file_id)
+    return [
+        (kind, file_ids[i:i + ALBUM_SIZE])
+        for kind, file_ids in groups.items()
+        for i in range(0, len(file_ids), ALBUM_SIZE)
+    ]
+
+
+async def _deliver_albums(scheduler, chat_id, materials, content_type):
+    pending = []
+    for kind, file_ids in build_albums(materials, content_type):
+        # الألبوم يحتاج عنصرين على الأقل
+        if len(file_ids) == 1:
+            send_single(scheduler, chat_id, file_ids[0], kind)
+            continue
+        media = [{"type": kind, "media": file_id} for file_id in file_ids]
+        future = scheduler.submit("sendMediaGroup", {"chat_id": chat_id, "media": media}, priority=BULK)
+        pending.append((kind, file_ids, future))
+
+    for kind, file_ids, future in pending:
+        result = await future
+        if result.get("ok"):
+            continue
+        # تلجرام يرفض الألبوم كاملاً؛ نرسل عناصره فرادى حتى يفشل المعطوب وحده
+        logger.warning(f"sendMediaGroup rejected for {chat_id}: {result.get('description')}, "
+                       f"falling back to {len(file_ids)} single sends")
+        for file_id in file_ids:
+            send_single(scheduler, chat_id, file_id, kind)
+
+
+def deliver_materials(scheduler, chat_id, materials, content_type="pdf", mode=None):
+    """إرسال مواد مقرر للمستخدم في الخلفية"""
+    mode = mode or DELIVERY_MODE
+    if mode != "album":
+        kind = media_kind(content_type)
+        for m in materials:
+            send_single(scheduler, chat_id, m.get("file_id"), kind)
+        return None
+
+    task = asyncio.get_running_loop().create_task(
+        _deliver_albums(scheduler, chat_id, materials, content_type))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
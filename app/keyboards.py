@@ -0,0 +1,115 @@
+import json
+from app.curriculum import SEMESTERS, COURSES_BY_SEMESTER, ALL_COURSES, CONTENT_TYPES, type_button
+
+# ========= نصوص الأزرار الثابتة =========
+BTN_START = "ابدأ 🎓"
+BTN_CONTACT = "تواصل مع المطور 👨‍💻"
+BTN_UPLOAD = "رفع ملف جديد 📤"
+BTN_HOME = "🏠 القائمة الرئيسية"
+BTN_BACK = "⬅️ رجوع"
+
+
+def _serialize(keyboard):
+    """reply_markup جاهز كنص JSON (تلجرام يقبله كما هو)"""
+    return json.dumps({"keyboard": keyboard, "resize_keyboard": True}, ensure_ascii=False)
+
+
+def _rows(texts, per_row):
+    return [[{"text": t} for t in texts[i:i + per_row]] for i in range(0, len(texts), per_row)]
+
+
+# ========= القوائم (تُبنى مرة واحدة عند الإقلاع) =========
+MAIN_KEYBOARD = _serialize([[{"text": BTN_START}], [{"text": BTN_CONTACT}]])
+MAIN_KEYBOARD_ADMIN = _serialize([[{"text": BTN_START}], [{"text": BTN_CONTACT}], [{"text": BTN_UPLOAD}]])
+
+SEMESTERS_KEYBOARD = _serialize(
+    _rows([s["label"] for s in SEMESTERS], 2) + [[{"text": BTN_HOME}]]
+)
+
+COURSES_KEYBOARDS = {
+    semester: _serialize(_rows(courses, 1) + [[{"text": BTN_BACK}, {"text": BTN_HOME}]])
+    for semester, courses in COURSES_BY_SEMESTER.items()
+}
+NO_COURSES_KEYBOARD = _serialize([[{"text": "لا توجد مقررات"}], [{"text": BTN_BACK}, {"text": BTN_HOME}]])
+
+TYPES_KEYBOARDS = {
+    course: _serialize(
+        _rows([type_button(course, t) for t, _ in CONTENT_TYPES], 2)
+        + [[{"text": BTN_BACK}, {"text": BTN_HOME}]]
+    )
+    for course in ALL_COURSES
+}
+
+
+def main_keyboard(is_admin=False):
+    return MAIN_KEYBOARD_ADMIN if is_admin else MAIN_KEYBOARD
+
+
+def courses_keyboard(semester):
+    return COURSES_KEYBOARDS.get(semester, NO_COURSES_KEYBOARD)
+
+
+def types_keyboard(course):
+    return TYPES_KEYBOARDS[course]
+
+
+# ========= قوائم المواد على صفحات (inline keyboard) =========
+# callback_data = "<action>:<semester>:<رقم المقرر>:<رقم النوع>[:<n>]" (أقل من 64 بايت)
+# كل حالة الصفحة داخل الزر نفسه، فلا حاجة لجلسة على الخادم
+CB_PAGE = "p"    # n = رقم الصفحة
+CB_ITEM = "i"    # n = ترتيب المادة في القائمة
+CB_ALL = "a"     # إرسال الكل
+CB_NOOP = "n"    # زر رقم الصفحة
+
+COURSE_INDEX = {course: i for i, course in enumerate(ALL_COURSES)}
+TYPE_IDS = [t for t, _ in CONTENT_TYPES]
+TYPE_INDEX = {t: i for i, t in enumerate(TYPE_IDS)}
+TYPE_ICONS = {"pdf": "📄", "video": "🎥", "reference": "📚"}
+
+
+def encode_callback(action, semester, course, type_, n=None):
+    data = f"{action}:{semester}:{COURSE_INDEX[course]}:{TYPE_INDEX[type_]}"
+    return data if n is None else f"{data}:{n}"
+
+
+def decode_callback(data):
+    """(action, semester, course, type, n) أو None إذا كانت البيانات غير صالحة"""
+    parts = (data or "").split(":")
+    if len(parts) not in (4, 5):
+        return None
+    try:
+        action, semester = parts[0], parts[1]
+        course, type_ = ALL_COURSES[int(parts[2])], TYPE_IDS[int(parts[3])]
+        n = int(parts[4]) if len(parts) == 5 else None
+    except (ValueError, IndexError):
+        return None
+    if semester not in COURSES_BY_SEMESTER or (n is not None and n < 0):
+        return None
+    return action, semester, course, type_, n
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def listing_keyboard(semester, course, type_, materials, page, page_size):
+    """أزرار مواد صفحة واحدة + التنقل + إرسال الكل"""
+    pages = page_count(len(materials), page_size)
+    start = page * page_size
+    icon = TYPE_ICONS.get(type_, "📄")
+    rows = []
+    for n in range(start, min(start + page_size, len(materials))):
+        date = str(materials[n].get("created_at") or "")[:10]
+        label = f"{icon} ملف {n + 1}" + (f" · {date}" if date else "")
+        rows.append([{"text": label, "callback_data": encode_callback(CB_ITEM, semester, course, type_, n)}])
+
+    nav = []
+    if page > 0:
+        nav.append({"text": "◀️", "callback_data": encode_callback(CB_PAGE, semester, course, type_, page - 1)})
+    nav.append({"text": f"{page + 1}/{pages}", "callback_data": encode_callback(CB_NOOP, semester, course, type_)})
+    if page < pages - 1:
+        nav.append({"text": "▶️", "callback_data": encode_callback(CB_PAGE, semester, course, type_, page + 1)})
+    rows.append(nav)
+    rows.append([{"text": f"📥 إرسال الكل ({len(materials)})",
+                  "callback_data": encode_callback(CB_ALL, semester, course, type_)}])
+    return json.dumps({"inline_keyboard": rows}, ensure_ascii=False)
@@ -1,8 +1,25 @@
 import os
-import requests
+import time
+import asyncio
 import logging
 from fastapi import FastAPI, Header, HTTPException
-from app import crud
+from fastapi.responses import PlainTextResponse, JSONResponse
+from app import crud, admin_api
+from app.telegram import TelegramClient
+from app.scheduler import SendScheduler, INTERACTIVE
+from app.delivery import deliver_materials, send_single, media_kind
+from app.pipeline import UpdatePipeline, FULL
+from app.router import Router, Context
+from app.sessions import create_session_store
+from app.storage import StorageUnavailable
+from app.metrics import REGISTRY, WEBHOOK_SECONDS, UPDATE_SECONDS
+from app.curriculum import SEMESTER_BY_LABEL, ALL_COURSES, TYPE_BY_BUTTON, CONTENT_TYPES
+from app.search import SEMESTER_LABELS
+from app.keyboards import (
+    BTN_START, BTN_CONTACT, BTN_UPLOAD, BTN_HOME, BTN_BACK,
+    SEMESTERS_KEYBOARD, main_keyboard, courses_keyboard, types_keyboard,
+    CB_PAGE, CB_ITEM, CB_ALL, CB_NOOP, decode_callback, listing_keyboard, page_count,
+)
 
 # ========= Logging مفصل =========
 logging.basicConfig(
@@ -15,290 +32,434 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", None)
 ADMIN_USERNAME = "@Mgdad_Ali"
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}"
+
+telegram = TelegramClient(BOT_TOKEN)
+scheduler = SendScheduler(telegram)
 
 app = FastAPI(title="Med Faculty Bot")
+app.include_router(admin_api.router)
+
+# ========= الإقلاع =========
+# الخادم يقبل التحديثات فوراً، والتهيئة (Google Sheets / قاعدة البيانات) تعمل في الخلفية
+# التحديثات تنتظر في الطابور حتى تنتهي التهيئة
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP = {"ready": False, "stage": "starting", "error": None, "seconds": None}
+_warmup_task = None
+
+async def warm_up():
+    started = time.perf_counter()
+    while True:
+        WARMUP["stage"] = "init_db"
+        try:
+            await asyncio.to_thread(crud.init_db)
+            break
+        except Exception as e:
+            WARMUP["error"] = str(e)
+            logger.exception(f"Database initialization failed, retrying in {WARMUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    WARMUP.update(ready=True, stage="ready", error=None, seconds=round(time.perf_counter() - started, 3))
+    logger.info(f"✅ Database initialized successfully in {WARMUP['seconds']}s.")
+    pipeline.resume()
+
+async def wait_ready():
+    if _warmup_task is not None:
+        await asyncio.shield(_warmup_task)
 
 @app.on_event("startup")
 async def startup():
-    crud.init_db()
-    logger.info("✅ Database initialized successfully.")
-
-# ========= إدارة انتظار رفع الملف داخل الذاكرة =========
-WAITING_STATE = {}  # keyed by chat_id -> {"file_id":..., "semester":..., "course":..., "type":...}
+    global _warmup_task
+    scheduler.start()
+    pipeline.start(paused=True)
+    _warmup_task = asyncio.get_running_loop().create_task(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    await pipeline.stop()
+    await scheduler.stop()
+    await telegram.aclose()
+    crud.flush_pending()
+
+# ========= إدارة انتظار رفع الملف =========
+WAITING_STATE = create_session_store("waiting")  # keyed by chat_id -> {"file_id":..., "semester":..., "course":..., "type":...}
 
 # ========= حالة المستخدم لاختيار السمستر والمقرر والنوع =========
-USER_STATE = {}  # keyed by chat_id -> {"semester": ..., "course": ..., "type": ...}
+USER_STATE = create_session_store("user")  # keyed by chat_id -> {"semester": ..., "course": ..., "type": ...}
 
 # ========= دوال مساعدة =========
-def send_message(chat_id, text, reply_markup=None):
+async def send_message(chat_id, text, reply_markup=None):
     payload = {"chat_id": chat_id, "text": text}
     if reply_markup:
         payload["reply_markup"] = reply_markup
-    try:
-        r = requests.post(f"{TELEGRAM_API}/sendMessage", json=payload)
-        logger.info(f"Send message status: {r.status_code}, response: {r.text}")
-    except Exception as e:
-        logger.exception(f"Failed to send message: {e}")
-
-def send_file(chat_id, file_id, content_type="pdf"):
-    try:
-        if content_type == "video":
-            r = requests.post(f"{TELEGRAM_API}/sendVideo", json={"chat_id": chat_id, "video": file_id})
-        else:
-            r = requests.post(f"{TELEGRAM_API}/sendDocument", json={"chat_id": chat_id, "document": file_id})
-        logger.info(f"Send file status: {r.status_code}, response: {r.text}")
-    except Exception as e:
-        logger.exception(f"Failed to send file: {e}")
+    return await scheduler.call("sendMessage", payload, priority=INTERACTIVE)
 
 def is_admin(user):
     return user.get("username") == ADMIN_USERNAME.replace("@", "")
 
-# ========= القوائم =========
-def get_main_keyboard(is_admin=False):
-    buttons = [[{"text": "ابدأ 🎓"}], [{"text": "تواصل مع المطور 👨‍💻"}]]
-    if is_admin:
-        buttons.append([{"text": "رفع ملف جديد 📤"}])
-    return {"keyboard": buttons, "resize_keyboard": True}
-
-def get_semesters_keyboard():
-    return {
-        "keyboard": [
-            [{"text": "الفصل الأول 1️⃣"}, {"text": "الفصل الثاني 2️⃣"}],
-            [{"text": "الفصل الثالث 3️⃣"}, {"text": "الفصل الرابع 4️⃣"}],
-            [{"text": "الفصل الخامس 5️⃣"}],
-            [{"text": "🏠 القائمة الرئيسية"}]
-        ],
-        "resize_keyboard": True
-    }
-
-def get_courses_keyboard(semester):
-    # تحديد المقررات حسب كل سمستر
-    courses_map = {
-        "1": [["Anatomy"], ["Histology"], ["Embryology"]],
-        "2": [["Anatomy"], ["Physiology"], ["Biochemistry"]],
-        "3": [["Pathology"], ["Pharmacology"], ["Microbiology"]],
-        "4": [["Pathology"], ["Pharmacology"], ["Parasitology"]],
-        "5": [["Medicine"], ["Surgery"], ["Pediatrics"]],
-    }
-    
-    course_buttons = courses_map.get(semester, [[{"text": "لا توجد مقررات"}]])
-    course_buttons.append([{"text": "⬅️ رجوع"}, {"text": "🏠 القائمة الرئيسية"}])
-    
-    return {"keyboard": course_buttons, "resize_keyboard": True}
-
-def get_types_keyboard(course):
-    return {
-        "keyboard": [
-            [{"text": f"{course} 📄 PDF"}, {"text": f"{course} 🎥 فيديو"}],
-            [{"text": f"{course} 📚 مرجع"}],
-            [{"text": "⬅️ رجوع"}, {"text": "🏠 القائمة الرئيسية"}]
-        ],
-        "resize_keyboard": True
-    }
-
 # ========= Webhook =========
 @app.post("/webhook")
 async def webhook(update: dict, x_telegram_bot_api_secret_token: str = Header(None)):
-    try:
+    """التحقق من السر ثم إضافة التحديث للطابور والرد فوراً"""
+    with WEBHOOK_SECONDS.time():
         if WEBHOOK_SECRET_TOKEN and x_telegram_bot_api_secret_token != WEBHOOK_SECRET_TOKEN:
             logger.warning("Invalid secret token received.")
             raise HTTPException(status_code=401, detail="Invalid secret header")
 
+        if pipeline.submit(update) == FULL:
+            # تلجرام سيعيد إرسال التحديث لاحقاً
+            logger.warning("Update queue is full, asking Telegram to retry.")
+            raise HTTPException(status_code=503, detail="Update queue is full")
+        return {"ok": True}
+
+# ========= الفحوصات =========
+@app.get("/healthz")
+async def healthz():
+    """الخادم يعمل (حتى أثناء التهيئة)"""
+    return {"ok": True}
+
+@app.get("/readyz")
+async def readyz():
+    """جاهز بعد انتهاء التهيئة؛ 503 قبلها"""
+    body = {**WARMUP, "pending_updates": pipeline.pending, "storage": crud.health()}
+    return JSONResponse(body, status_code=200 if WARMUP["ready"] else 503)
+
+# ========= المقاييس =========
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# ========= الردود الثابتة =========
+WELCOME_TEXT = (
+    "👋 مرحبًا بك في بوت كلية الطب – جامعة المناقل!\n\n"
+    "📚 هذا البوت يساعدك للوصول إلى محتوى المقررات بسهولة.\n"
+    "⚠️ تنويه: البوت في مراحل الصيانة لرفع كميات كبيرة من المواد.\n"
+)
+CONTACT_TEXT = f"📩 تواصل مع المطور: {ADMIN_USERNAME}"
+UNKNOWN_TEXT = "🤔 لم أفهم الأمر، يرجى اختيار من القائمة."
+ADDFILE_USAGE = "❌ الصيغة الصحيحة:\n/addfile <semester> <course> <type> <file_id>"
+
+router = Router()
+
+# ===== أوامر الأدمن =====
+@router.text(BTN_UPLOAD)
+async def on_upload(ctx, _):
+    if not ctx.admin:
+        return await on_unknown(ctx, None)
+    await asyncio.to_thread(crud.set_waiting_file, ctx.chat_id, True)
+    await send_message(ctx.chat_id, "📤 الآن أرسل الملف (PDF / فيديو) وسأطلب اختيار السمستر بعد الاستلام.")
+
+@router.command("/addfile")
+async def on_addfile(ctx, _):
+    if not ctx.admin:
+        return await on_unknown(ctx, None)
+    parts = ctx.text.split()
+    if len(parts) == 5:
+        semester, course, ctype, file_id = parts[1], parts[2], parts[3], parts[4]
+        await asyncio.to_thread(crud.add_material, semester, course, ctype, file_id)
+        await send_message(ctx.chat_id, f"✅ تمت إضافة {ctype} لمادة {course} (سمستر {semester}) بنجاح!")
+    else:
+        await send_message(ctx.chat_id, ADDFILE_USAGE)
+
+# ===== أوامر المستخدم =====
+@router.command("/start")
+async def on_start(ctx, _):
+    await USER_STATE.apop(ctx.chat_id, None)
+    await send_message(ctx.chat_id, WELCOME_TEXT, reply_markup=main_keyboard(ctx.admin))
+
+@router.text(BTN_CONTACT)
+async def on_contact(ctx, _):
+    await send_message(ctx.chat_id, CONTACT_TEXT)
+
+@router.text(BTN_HOME)
+async def on_home(ctx, _):
+    await USER_STATE.apop(ctx.chat_id, None)
+    await WAITING_STATE.apop(ctx.chat_id, None)
+    await send_message(ctx.chat_id, "🏠 عدت إلى القائمة الرئيسية", reply_markup=main_keyboard(ctx.admin))
+
+@router.text(BTN_START)
+async def on_begin(ctx, _):
+    await USER_STATE.apop(ctx.chat_id, None)
+    await send_message(ctx.chat_id, "📚 اختر الفصل الدراسي:", reply_markup=SEMESTERS_KEYBOARD)
+
+@router.text(BTN_BACK)
+async def on_back(ctx, _):
+    state = await USER_STATE.aget(ctx.chat_id, {})
+
+    # إذا كان عند اختيار النوع، نرجع لاختيار المقرر
+    if state.get("course") and state.get("semester"):
+        state.pop("type", None)
+        state.pop("course", None)
+        await USER_STATE.aset(ctx.chat_id, state)
+        await send_message(ctx.chat_id, "⬅️ اختر المقرر:", reply_markup=courses_keyboard(state.get("semester")))
+        return
+
+    # إذا كان عند اختيار المقرر (أو افتراضياً)، نرجع لاختيار السمستر
+    await USER_STATE.apop(ctx.chat_id, None)
+    await send_message(ctx.chat_id, "⬅️ اختر الفصل الدراسي:", reply_markup=SEMESTERS_KEYBOARD)
+
+# ===== اختيار السمستر =====
+async def on_semester(ctx, semester):
+    # للأدمن: حفظ السمستر في WAITING_STATE
+    waiting_local = await WAITING_STATE.aget(ctx.chat_id) if ctx.admin else None
+    if waiting_local is not None:
+        waiting_local["semester"] = semester
+        await WAITING_STATE.aset(ctx.chat_id, waiting_local)
+        await send_message(ctx.chat_id, f"✅ تم اختيار {ctx.text}. الآن اختر المقرر:", reply_markup=courses_keyboard(semester))
+        return
+
+    # للمستخدم العادي: حفظ في USER_STATE
+    await USER_STATE.aset(ctx.chat_id, {"semester": semester})
+    await send_message(ctx.chat_id, f"📖 اختر المقرر من {ctx.text}:", reply_markup=courses_keyboard(semester))
+
+router.add_texts(SEMESTER_BY_LABEL, on_semester)
+
+# ===== اختيار المقرر =====
+async def on_course(ctx, course):
+    # للأدمن: حفظ المقرر في WAITING_STATE
+    waiting_local = await WAITING_STATE.aget(ctx.chat_id) if ctx.admin else None
+    if waiting_local is not None:
+        waiting_local["course"] = course
+        await WAITING_STATE.aset(ctx.chat_id, waiting_local)
+        await send_message(ctx.chat_id, f"📂 اختر نوع المحتوى لمقرر {course}:", reply_markup=types_keyboard(course))
+        return
+
+    # للمستخدم: حفظ المقرر
+    state = await USER_STATE.aget(ctx.chat_id, {})
+    if not state.get("semester"):
+        await send_message(ctx.chat_id, "⚠️ يرجى اختيار السمستر أولاً")
+        return
+
+    state["course"] = course
+    await USER_STATE.aset(ctx.chat_id, state)
+    await send_message(ctx.chat_id, f"📂 اختر نوع المحتوى لمقرر {course}:", reply_markup=types_keyboard(course))
+
+router.add_texts({c: c for c in ALL_COURSES}, on_course)
+
+# ===== اختيار نوع الملف =====
+async def on_type(ctx, selection):
+    course_name, ctype = selection
+    chat_id = ctx.chat_id
+
+    # للأدمن: حفظ الملف نهائياً
+    waiting_local = await WAITING_STATE.aget(chat_id) if ctx.admin else None
+    if waiting_local is not None:
+        file_id = waiting_local.get("file_id")
+        semester = waiting_local.get("semester")
+        course = waiting_local.get("course") or course_name
+
+        if not file_id or not semester:
+            await send_message(chat_id, "❌ بيانات غير مكتملة. أعد العملية.")
+            return
+
+        await asyncio.to_thread(crud.add_material, semester, course, ctype, file_id)
+
+        try:
+            await asyncio.to_thread(crud.set_waiting_file, chat_id, False)
+        except Exception:
+            logger.exception("Failed to clear waiting_file in sheet (ignored).")
+
+        await WAITING_STATE.apop(chat_id, None)
+        await send_message(chat_id, f"✅ تم حفظ الملف للسمستر {semester} - مقرر {course} ({ctype})")
+        return
+
+    # للمستخدم: عرض الملفات مباشرة
+    state = await USER_STATE.aget(chat_id, {})
+    semester = state.get("semester")
+    course = state.get("course")
+
+    if not semester or not course:
+        await send_message(chat_id, "⚠️ يرجى اختيار السمستر والمقرر أولاً")
+        return
+
+    # جلب الملفات من قاعدة البيانات
+    try:
+        mats = await asyncio.to_thread(crud.get_materials, semester, course, ctype, use_cache=True)
+    except StorageUnavailable as e:
+        # لا نخبر الطالب بعدم وجود ملفات لمجرد أن Google Sheets متوقف
+        logger.warning(f"Materials unavailable for {chat_id}: {e}")
+        await send_message(chat_id, "⏳ الخدمة مشغولة حالياً، يرجى المحاولة بعد قليل")
+        return
+
+    if not mats:
+        await send_message(chat_id, f"🚧 لا توجد ملفات متاحة حالياً لـ {course} ({ctype})")
+        return
+
+    # قائمة كبيرة: صفحات بدل إرسال كل الملفات دفعة واحدة
+    if LISTING_PAGE_SIZE and len(mats) > LISTING_PAGE_SIZE:
+        await send_message(chat_id, listing_text(course, ctype, 0, len(mats)),
+                           reply_markup=listing_keyboard(semester, course, ctype, mats, 0, LISTING_PAGE_SIZE))
+        return
+
+    await send_message(chat_id, f"📤 جاري إرسال ملفات {course} ({ctype})...")
+    deliver_materials(scheduler, chat_id, mats, content_type=ctype)
+
+router.add_texts(TYPE_BY_BUTTON, on_type)
+
+# ========= قوائم المواد على صفحات (callback_query) =========
+# 0 = إرسال كل الملفات مباشرة كما في السابق
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", "8"))
+
+def listing_text(course, ctype, page, total):
+    pages = page_count(total, LISTING_PAGE_SIZE)
+    return f"📚 {course} ({ctype}): {total} ملف — الصفحة {page + 1}/{pages}\nاختر ملفاً أو أرسلها كلها:"
+
+async def answer_callback(ctx, text=None):
+    """إيقاف مؤشر التحميل على الزر (لا يخضع لحدود الرسائل)"""
+    payload = {"callback_query_id": ctx.update["callback_query"]["id"]}
+    if text:
+        payload["text"] = text
+    await telegram.call("answerCallbackQuery", payload)
+
+async def load_listing(ctx, semester, course, ctype):
+    try:
+        return await asyncio.to_thread(crud.get_materials, semester, course, ctype, use_cache=True)
+    except StorageUnavailable as e:
+        logger.warning(f"Listing unavailable for {ctx.chat_id}: {e}")
+        await answer_callback(ctx, "⏳ الخدمة مشغولة حالياً، يرجى المحاولة بعد قليل")
+        return None
+
+@router.callback(CB_PAGE)
+async def on_listing_page(ctx, parsed):
+    semester, course, ctype, page = parsed
+    mats = await load_listing(ctx, semester, course, ctype)
+    if mats is None:
+        return
+    page = min(page, page_count(len(mats), LISTING_PAGE_SIZE) - 1)
+    if ctx.msg:
+        await scheduler.call("editMessageText", {
+            "chat_id": ctx.chat_id,
+            "message_id": ctx.msg["message_id"],
+            "text": listing_text(course, ctype, page, len(mats)),
+            "reply_markup": listing_keyboard(semester, course, ctype, mats, page, LISTING_PAGE_SIZE),
+        }, priority=INTERACTIVE)
+    await answer_callback(ctx)
+
+@router.callback(CB_ITEM)
+async def on_listing_item(ctx, parsed):
+    semester, course, ctype, n = parsed
+    mats = await load_listing(ctx, semester, course, ctype)
+    if mats is None:
+        return
+    if n is None or n >= len(mats):
+        await answer_callback(ctx, "⚠️ الملف لم يعد متاحاً")
+        return
+    send_single(scheduler, ctx.chat_id, mats[n]["file_id"], media_kind(mats[n].get("type") or ctype))
+    await answer_callback(ctx, f"📤 ملف {n + 1}")
+
+@router.callback(CB_ALL)
+async def on_listing_all(ctx, parsed):
+    semester, course, ctype, _ = parsed
+    mats = await load_listing(ctx, semester, course, ctype)
+    if mats is None:
+        return
+    deliver_materials(scheduler, ctx.chat_id, mats, content_type=ctype)
+    await answer_callback(ctx, f"📤 جاري إرسال {len(mats)} ملف")
+
+@router.callback(CB_NOOP)
+async def on_listing_noop(ctx, _):
+    await answer_callback(ctx)
+
+async def on_callback_query(update):
+    query = update["callback_query"]
+    msg = query.get("message")
+    user = query.get("from", {})
+    chat_id = (msg or {}).get("chat", {}).get("id") or user.get("id")
+    ctx = Context(update, msg, chat_id, query.get("data", ""), user, is_admin(user))
+    parsed = decode_callback(ctx.text)
+    if parsed is None or not await router.dispatch_callback(ctx, parsed[0], parsed[1:]):
+        await answer_callback(ctx, "⚠️ انتهت صلاحية هذه القائمة")
+
+# ========= البحث المباشر (inline mode) =========
+INLINE_PAGE_SIZE = 20
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))  # ثواني يحتفظ بها تلجرام بالنتائج
+TYPE_LABELS = dict(CONTENT_TYPES)
+
+def inline_result(material_id, m):
+    """مادة -> نتيجة inline تُرسل الملف مباشرة من file_id"""
+    result = {
+        "id": str(material_id),
+        "title": f"{m['course']} {TYPE_LABELS.get(m['type'], m['type'])}",
+        "description": SEMESTER_LABELS.get(str(m["semester"]), str(m["semester"])),
+    }
+    if m["type"] == "video":
+        result.update(type="video", video_file_id=m["file_id"])
+    else:
+        result.update(type="document", document_file_id=m["file_id"])
+    return result
+
+async def on_inline_query(inline):
+    """البحث من الذاكرة مع صفحات next_offset (بدون أي طلب لقاعدة البيانات)"""
+    try:
+        offset = max(0, int(inline.get("offset") or 0))
+    except ValueError:
+        offset = 0
+    found, total = crud.search_materials(inline.get("query", ""), offset, INLINE_PAGE_SIZE)
+    end = offset + len(found)
+    await telegram.call("answerInlineQuery", {
+        "inline_query_id": inline["id"],
+        "results": [inline_result(i, m) for i, m in found],
+        "cache_time": INLINE_CACHE_TIME,
+        "next_offset": str(end) if end < total else "",
+    })
+
+# افتراضي
+@router.fallback
+async def on_unknown(ctx, _):
+    await send_message(ctx.chat_id, UNKNOWN_TEXT)
+
+# ========= معالجة التحديث =========
+async def process_update(update):
+    with UPDATE_SECONDS.time():
+        await _process_update(update)
+
+async def _process_update(update):
+    try:
         logger.debug(f"Received update: {update}")
+        if "inline_query" in update:
+            await on_inline_query(update["inline_query"])
+            return
+        if "callback_query" in update:
+            await on_callback_query(update)
+            return
+
         msg = update.get("message")
         if not msg:
-            return {"ok": True}
+            return
 
         chat_id = msg["chat"]["id"]
-        text = msg.get("text", "")
         user = msg.get("from", {})
-
-        # التقاط الملفات
-        file_info = None
-        content_type = None
-        if "document" in msg:
-            file_info = msg["document"]
-            content_type = "pdf"
-        elif "video" in msg:
-            file_info = msg["video"]
-            content_type = "video"
+        admin = is_admin(user)
 
         # ===== إدارة الملفات من الأدمن =====
-        if file_info and is_admin(user):
-            file_id = file_info.get("file_id")
-            WAITING_STATE[chat_id] = {
-                "file_id": file_id,
+        file_info = msg.get("document") or msg.get("video")
+        if file_info and admin:
+            await WAITING_STATE.aset(chat_id, {
+                "file_id": file_info.get("file_id"),
                 "semester": None,
                 "course": None,
-                "type": content_type
-            }
-            send_message(chat_id, "✅ تم استلام الملف. الآن اختر السمستر:", reply_markup=get_semesters_keyboard())
-            return {"ok": True}
-
-        # ===== أوامر الأدمن =====
-        if text == "رفع ملف جديد 📤" and is_admin(user):
-            crud.set_waiting_file(chat_id, True)
-            send_message(chat_id, "📤 الآن أرسل الملف (PDF / فيديو) وسأطلب اختيار السمستر بعد الاستلام.")
-            return {"ok": True}
-
-        if text and text.startswith("/addfile") and is_admin(user):
-            parts = text.split()
-            if len(parts) == 5:
-                semester, course, ctype, file_id = parts[1], parts[2], parts[3], parts[4]
-                crud.add_material(semester, course, ctype, file_id)
-                send_message(chat_id, f"✅ تمت إضافة {ctype} لمادة {course} (سمستر {semester}) بنجاح!")
-            else:
-                send_message(chat_id, "❌ الصيغة الصحيحة:\n/addfile <semester> <course> <type> <file_id>")
-            return {"ok": True}
-
-        # ===== أوامر المستخدم =====
-        if text == "/start":
-            USER_STATE.pop(chat_id, None)
-            welcome_text = (
-                "👋 مرحبًا بك في بوت كلية الطب – جامعة المناقل!\n\n"
-                "📚 هذا البوت يساعدك للوصول إلى محتوى المقررات بسهولة.\n"
-                "⚠️ تنويه: البوت في مراحل الصيانة لرفع كميات كبيرة من المواد.\n"
-            )
-            send_message(chat_id, welcome_text, reply_markup=get_main_keyboard(is_admin(user)))
-            return {"ok": True}
-
-        if text == "تواصل مع المطور 👨‍💻":
-            send_message(chat_id, f"📩 تواصل مع المطور: {ADMIN_USERNAME}")
-            return {"ok": True}
-
-        if text == "🏠 القائمة الرئيسية":
-            USER_STATE.pop(chat_id, None)
-            WAITING_STATE.pop(chat_id, None)
-            send_message(chat_id, "🏠 عدت إلى القائمة الرئيسية", reply_markup=get_main_keyboard(is_admin(user)))
-            return {"ok": True}
-
-        if text == "ابدأ 🎓":
-            USER_STATE.pop(chat_id, None)
-            send_message(chat_id, "📚 اختر الفصل الدراسي:", reply_markup=get_semesters_keyboard())
-            return {"ok": True}
-
-        if text == "⬅️ رجوع":
-            state = USER_STATE.get(chat_id, {})
-            
-            # إذا كان عند اختيار النوع، نرجع لاختيار المقرر
-            if state.get("course") and state.get("semester"):
-                state.pop("type", None)
-                state.pop("course", None)
-                send_message(chat_id, f"⬅️ اختر المقرر:", reply_markup=get_courses_keyboard(state.get("semester")))
-                return {"ok": True}
-            
-            # إذا كان عند اختيار المقرر، نرجع لاختيار السمستر
-            if state.get("semester"):
-                USER_STATE.pop(chat_id, None)
-                send_message(chat_id, "⬅️ اختر الفصل الدراسي:", reply_markup=get_semesters_keyboard())
-                return {"ok": True}
-            
-            # افتراضي: رجوع للسمسترات
-            send_message(chat_id, "⬅️ اختر الفصل الدراسي:", reply_markup=get_semesters_keyboard())
-            return {"ok": True}
-
-        # ===== اختيار السمستر =====
-        semester_map = {
-            "الفصل الأول 1️⃣": "1",
-            "الفصل الثاني 2️⃣": "2",
-            "الفصل الثالث 3️⃣": "3",
-            "الفصل الرابع 4️⃣": "4",
-            "الفصل الخامس 5️⃣": "5"
-        }
-        
-        if text in semester_map:
-            semester = semester_map[text]
-            
-            # للأدمن: حفظ السمستر في WAITING_STATE
-            if is_admin(user) and chat_id in WAITING_STATE:
-                WAITING_STATE[chat_id]["semester"] = semester
-                send_message(chat_id, f"✅ تم اختيار {text}. الآن اختر المقرر:", reply_markup=get_courses_keyboard(semester))
-                return {"ok": True}
-            
-            # للمستخدم العادي: حفظ في USER_STATE
-            USER_STATE[chat_id] = {"semester": semester}
-            send_message(chat_id, f"📖 اختر المقرر من {text}:", reply_markup=get_courses_keyboard(semester))
-            return {"ok": True}
-
-        # ===== اختيار المقرر =====
-        course_names = [
-            "Anatomy", "Pathology", "Histology", "Parasitology",
-            "Physiology", "Biochemistry", "Embryology",
-            "Microbiology", "Pharmacology", "Medicine", "Surgery", "Pediatrics"
-        ]
-
-        if text in course_names:
-            # للأدمن: حفظ المقرر في WAITING_STATE
-            if is_admin(user) and chat_id in WAITING_STATE:
-                WAITING_STATE[chat_id]["course"] = text
-                send_message(chat_id, f"📂 اختر نوع المحتوى لمقرر {text}:", reply_markup=get_types_keyboard(text))
-                return {"ok": True}
-            
-            # للمستخدم: حفظ المقرر
-            state = USER_STATE.get(chat_id, {})
-            if not state.get("semester"):
-                send_message(chat_id, "⚠️ يرجى اختيار السمستر أولاً")
-                return {"ok": True}
-            
-            state["course"] = text
-            USER_STATE[chat_id] = state
-            send_message(chat_id, f"📂 اختر نوع المحتوى لمقرر {text}:", reply_markup=get_types_keyboard(text))
-            return {"ok": True}
-
-        # ===== اختيار نوع الملف =====
-        if text and any(x in text for x in ["PDF", "فيديو", "مرجع"]):
-            course_name = text.split()[0]
-            ctype = "pdf" if "PDF" in text else "video" if "فيديو" in text else "reference"
-
-            # للأدمن: حفظ الملف نهائياً
-            if is_admin(user) and chat_id in WAITING_STATE:
-                waiting_local = WAITING_STATE.get(chat_id, {})
-                file_id = waiting_local.get("file_id")
-                semester = waiting_local.get("semester")
-                course = waiting_local.get("course") or course_name
-
-                if not file_id or not semester:
-                    send_message(chat_id, "❌ بيانات غير مكتملة. أعد العملية.")
-                    return {"ok": True}
-
-                crud.add_material(semester, course, ctype, file_id)
-                
-                try:
-                    crud.set_waiting_file(chat_id, False)
-                except Exception:
-                    logger.exception("Failed to clear waiting_file in sheet (ignored).")
-
-                WAITING_STATE.pop(chat_id, None)
-                send_message(chat_id, f"✅ تم حفظ الملف للسمستر {semester} - مقرر {course} ({ctype})")
-                return {"ok": True}
-
-            # للمستخدم: عرض الملفات مباشرة
-            state = USER_STATE.get(chat_id, {})
-            semester = state.get("semester")
-            course = state.get("course")
-            
-            if not semester or not course:
-                send_message(chat_id, "⚠️ يرجى اختيار السمستر والمقرر أولاً")
-                return {"ok": True}
-
-            # جلب الملفات من قاعدة البيانات
-            mats = crud.get_materials(semester, course, ctype, use_cache=True)
-            
-            if not mats:
-                send_message(chat_id, f"🚧 لا توجد ملفات متاحة حالياً لـ {course} ({ctype})")
-                return {"ok": True}
-            
-            send_message(chat_id, f"📤 جاري إرسال ملفات {course} ({ctype})...")
-            for m in mats:
-                send_file(chat_id, m.get("file_id"), content_type=ctype)
-            
-            return {"ok": True}
-
-        # افتراضي
-        send_message(chat_id, "🤔 لم أفهم الأمر، يرجى اختيار من القائمة.")
-        return {"ok": True}
+                "type": "pdf" if "document" in msg else "video"
+            })
+            await send_message(chat_id, "✅ تم استلام الملف. الآن اختر السمستر:", reply_markup=SEMESTERS_KEYBOARD)
+            return
+
+        ctx = Context(update, msg, chat_id, msg.get("text", ""), user, admin)
+        await router.dispatch(ctx)
 
     except Exception as e:
         logger.exception(f"Exception in webhook processing: {e}")
-        return {"ok": True}
+
+pipeline = UpdatePipeline(process_update)
+
+REGISTRY.gauge("medbot_updates_in_flight", "Updates being processed right now",
+               fn=lambda: pipeline.in_flight)
+REGISTRY.gauge("medbot_updates_pending", "Updates queued or being processed",
+               fn=lambda: pipeline.pending)
+REGISTRY.gauge("medbot_send_queue_pending", "Outbound Telegram calls waiting in the scheduler",
+               fn=lambda: scheduler.pending)
+REGISTRY.gauge("medbot_send_stat", "Outbound Telegram scheduler counters", labels=("stat",),
+               fn=lambda: [((k,), v) for k, v in scheduler.stats.items()])
+REGISTRY.gauge("medbot_session_op_avg_ms", "Average session store operation time", labels=("store", "op"),
+               fn=lambda: [((store.name, op), s["avg_ms"])
+                           for store in (USER_STATE, WAITING_STATE)
+                           for op, s in store.stats().items()])
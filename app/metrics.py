@@ -0,0 +1,174 @@
+import time
+import threading
+import contextlib
+
+# ===== مقاييس الأداء بصيغة Prometheus (بدون مكتبات إضافية) =====
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for values, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _labels(self.labels + ("le",), values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _labels(self.labels + ("le",), values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in self._values.items():
+                lines.append(f"{self.name}{_labels(self.labels, values)} {count}")
+        return lines
+
+
+class GaugeCallback:
+    """قيم تُقرأ وقت الطلب: fn() تعيد [(label values, value), ...] أو رقماً واحداً"""
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            result = self._fn()
+        except Exception:
+            return lines
+        if isinstance(result, (int, float)):
+            result = [((), result)]
+        for values, value in result:
+            lines.append(f"{self.name}{_labels(self.labels, tuple(values))} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self.register(GaugeCallback(name, help, fn, labels))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ===== المقاييس الأساسية =====
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    "medbot_webhook_seconds", "Time to accept a webhook request")
+UPDATE_SECONDS = REGISTRY.histogram(
+    "medbot_update_processing_seconds", "Time to fully process one update")
+TELEGRAM_SECONDS = REGISTRY.histogram(
+    "medbot_telegram_request_seconds", "Telegram Bot API call latency", labels=("method",))
+TELEGRAM_ERRORS = REGISTRY.counter(
+    "medbot_telegram_errors_total", "Failed Telegram Bot API calls", labels=("method", "code"))
+SHEETS_SECONDS = REGISTRY.histogram(
+    "medbot_sheets_request_seconds", "Google Sheets call latency", labels=("worksheet", "op"))
+SHEETS_ERRORS = REGISTRY.counter(
+    "medbot_sheets_errors_total", "Failed Google Sheets calls", labels=("worksheet", "op"))
+SHEETS_RETRIES = REGISTRY.counter(
+    "medbot_sheets_retries_total", "Google Sheets calls retried after 429/5xx", labels=("worksheet", "op"))
+SHEETS_REJECTED = REGISTRY.counter(
+    "medbot_sheets_rejected_total", "Google Sheets calls refused locally", labels=("reason",))
+LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "medbot_lock_wait_seconds", "Time spent waiting to acquire a lock", labels=("lock",),
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+
+class TimedLock:
+    """threading.Lock يسجل زمن الانتظار قبل الحصول عليه"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, self.name)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,159 @@
+import os
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات معالجة التحديثات =====
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "5000"))
+UPDATE_DEDUPE_SIZE = int(os.getenv("UPDATE_DEDUPE_SIZE", "10000"))
+
+# نتائج submit
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+FULL = "full"
+
+
+def chat_key(update):
+    """المفتاح الذي يُحفظ ترتيب التحديثات داخله"""
+    for field in ("message", "edited_message", "channel_post"):
+        if field in update:
+            return update[field].get("chat", {}).get("id")
+    if "callback_query" in update:
+        query = update["callback_query"]
+        message = query.get("message") or {}
+        return message.get("chat", {}).get("id") or query.get("from", {}).get("id")
+    if "inline_query" in update:
+        return update["inline_query"].get("from", {}).get("id")
+    # تحديث بدون محادثة: لا يحتاج ترتيباً
+    return ("update", update.get("update_id"))
+
+
+class UpdatePipeline:
+    """
+    طابور تحديثات تلجرام مع عدد محدود من العمال:
+    - نفس المحادثة تُعالج بالترتيب، والمحادثات المختلفة بالتوازي
+    - التحديث المكرر (نفس update_id) يُتجاهل
+    handler(update): دالة async تعالج تحديثاً واحداً
+    """
+
+    def __init__(self, handler, workers=UPDATE_WORKERS, max_pending=UPDATE_QUEUE_SIZE,
+                 dedupe_size=UPDATE_DEDUPE_SIZE):
+        self._handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self._chats = {}            # chat -> deque of updates
+        self._ready = None          # طابور المحادثات الجاهزة
+        self._tasks = []
+        self._pending = 0
+        self._in_flight = 0
+        self._seen = collections.OrderedDict()
+        self._dedupe_size = dedupe_size
+        self._idle = None
+        self._open = None           # مغلق = التحديثات تُقبل وتنتظر دون معالجة
+
+    # ===== التشغيل والإيقاف =====
+    def start(self, paused=False):
+        """paused=True: قبول التحديثات فوراً وتأجيل معالجتها حتى resume()"""
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._open = asyncio.Event()
+        if not paused:
+            self._open.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def resume(self):
+        self.start()
+        self._open.set()
+
+    @property
+    def paused(self):
+        return self._open is not None and not self._open.is_set()
+
+    async def stop(self, timeout=10):
+        """انتظار انتهاء التحديثات الحالية ثم إيقاف العمال"""
+        if not self._tasks:
+            return
+        try:
+            if not self.paused:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._pending:
+            logger.warning(f"Stopping with {self._pending} updates still pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        """انتظار انتهاء كل التحديثات المقبولة حتى الآن"""
+        if self._tasks:
+            await self._idle.wait()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    # ===== الاستقبال =====
+    def _is_duplicate(self, update_id):
+        if update_id is None:
+            return False
+        if update_id in self._seen:
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self._dedupe_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def submit(self, update):
+        """إضافة تحديث للطابور بدون انتظار معالجته"""
+        self.start()
+        if self._pending >= self.max_pending:
+            return FULL
+        if self._is_duplicate(update.get("update_id")):
+            return DUPLICATE
+
+        key = chat_key(update)
+        queue = self._chats.get(key)
+        if queue is None:
+            # المحادثة غير نشطة: نضيفها لطابور الجاهزين
+            queue = self._chats[key] = collections.deque()
+            self._ready.put_nowait(key)
+        queue.append(update)
+        self._pending += 1
+        self._idle.clear()
+        return ACCEPTED
+
+    # ===== العمال =====
+    async def _worker(self, n):
+        while True:
+            await self._open.wait()
+            key = await self._ready.get()
+            queue = self._chats[key]
+            update = queue.popleft()
+            self._in_flight += 1
+            try:
+                await self._handler(update)
+            except Exception as e:
+                logger.exception(f"Unhandled error while processing update: {e}")
+            finally:
+                self._in_flight -= 1
+                self._pending -= 1
+                if queue:
+                    # باقي تحديثات المحادثة تعود لآخر الطابور حتى لا تحتكر عاملاً
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                if self._pending == 0:
+                    self._idle.set()
@@ -0,0 +1,148 @@
+"""
+تشغيل البوت بـ getUpdates (long polling) بدل الـ webhook:
+    python -m app.polling
+"""
+import os
+import json
+import signal
+import asyncio
+import logging
+from app.pipeline import UpdatePipeline, DUPLICATE
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات long polling =====
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", "30"))          # ثواني ينتظرها تلجرام قبل الرد
+POLLING_LIMIT = int(os.getenv("POLLING_LIMIT", "100"))             # أقصى عدد تحديثات في الدفعة
+POLLING_OFFSET_FILE = os.getenv("POLLING_OFFSET_FILE", "./polling_offset.json")
+POLLING_RETRY_MAX = float(os.getenv("POLLING_RETRY_MAX", "30"))
+ALLOWED_UPDATES = ["message", "inline_query", "callback_query"]
+
+
+class OffsetStore:
+    """
+    حفظ offset في ملف محلي حتى لا تضيع التحديثات أو تتكرر بعد إعادة التشغيل
+    done: تحديثات الدفعة الحالية التي انتهت معالجتها (تُتخطى إذا أُعيد جلب الدفعة)
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data.get("offset", 0)), set(data.get("done", []))
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                logger.warning(f"Ignoring unreadable offset file {self.path}: {e}")
+            return 0, set()
+
+    def save(self, offset, done=()):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"offset": offset, "done": sorted(done)}, f)
+        os.replace(tmp, self.path)
+
+
+class PollingRunner:
+    """
+    جلب دفعات حتى POLLING_LIMIT تحديث ومعالجتها بنفس دالة الـ webhook
+    المحادثات المختلفة تُعالج بالتوازي، والدفعة التالية تُطلب بعد انتهاء الحالية
+    (طلب getUpdates بـ offset أكبر يؤكد لتلجرام استلام ما قبله)
+    """
+
+    def __init__(self, telegram, handler, offset_store, limit=POLLING_LIMIT, timeout=POLLING_TIMEOUT):
+        self.telegram = telegram
+        self.offset_store = offset_store
+        self.limit = limit
+        self.timeout = timeout
+        self.offset, self._done = offset_store.load()
+        self._handler = handler
+        self.pipeline = UpdatePipeline(self._handle)
+        self._stopping = asyncio.Event()
+        self.stats = {"batches": 0, "updates": 0, "skipped": 0, "errors": 0}
+
+    async def _handle(self, update):
+        try:
+            await self._handler(update)
+        finally:
+            # حفظ التقدم بعد كل تحديث: إعادة التشغيل لا تعيد معالجته
+            self._done.add(update["update_id"])
+            self.offset_store.save(self.offset, self._done)
+
+    def stop(self):
+        self._stopping.set()
+
+    async def fetch(self):
+        data = await self.telegram.call("getUpdates", {
+            "offset": self.offset,
+            "limit": self.limit,
+            "timeout": self.timeout,
+            "allowed_updates": ALLOWED_UPDATES,
+        }, timeout=self.timeout + 10)
+        if not data.get("ok"):
+            raise RuntimeError(data.get("description") or "getUpdates failed")
+        return data.get("result") or []
+
+    async def process(self, updates):
+        """معالجة دفعة كاملة ثم تقديم الـ offset بعد آخر تحديث فيها"""
+        for update in updates:
+            if update["update_id"] in self._done or self.pipeline.submit(update) == DUPLICATE:
+                self.stats["skipped"] += 1
+        await self.pipeline.join()
+        self.offset = max(u["update_id"] for u in updates) + 1
+        self._done.clear()
+        self.offset_store.save(self.offset)
+        self.stats["batches"] += 1
+        self.stats["updates"] += len(updates)
+
+    async def run(self):
+        self.pipeline.start()
+        # getUpdates لا يعمل مع webhook مفعّل (409)؛ التحديثات المعلقة تبقى
+        await self.telegram.call("deleteWebhook", {"drop_pending_updates": False})
+        logger.info(f"📡 Long polling started at offset {self.offset}")
+        delay = 1.0
+        while not self._stopping.is_set():
+            fetch = asyncio.ensure_future(self.fetch())
+            stopping = asyncio.ensure_future(self._stopping.wait())
+            await asyncio.wait({fetch, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            stopping.cancel()
+            if not fetch.done():
+                fetch.cancel()
+                break
+            try:
+                updates = fetch.result()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ getUpdates failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, POLLING_RETRY_MAX)
+                continue
+            delay = 1.0
+            if updates:
+                await self.process(updates)
+        await self.pipeline.stop()
+        logger.info(f"📡 Long polling stopped at offset {self.offset}")
+
+
+async def main():
+    from app import main as bot
+
+    await bot.startup()
+    await bot.wait_ready()
+    runner = PollingRunner(bot.telegram, bot.process_update, OffsetStore(POLLING_OFFSET_FILE))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, runner.stop)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await runner.run()
+    finally:
+        await bot.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import os
+import time
+import random
+import threading
+import logging
+from app.scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ===== حدود Google Sheets =====
+# تقريباً 60 طلب قراءة و60 طلب كتابة في الدقيقة لكل مستخدم
+SHEETS_READS_PER_MINUTE = float(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+SHEETS_WRITES_PER_MINUTE = float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+SHEETS_QUOTA_MAX_WAIT = float(os.getenv("SHEETS_QUOTA_MAX_WAIT", "10"))     # ثواني
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "0.5"))
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "8"))
+SHEETS_BREAKER_FAILURES = int(os.getenv("SHEETS_BREAKER_FAILURES", "3"))
+SHEETS_BREAKER_RESET = float(os.getenv("SHEETS_BREAKER_RESET", "30"))      # ثواني
+
+# عمليات gspread التي تُحسب من حصة القراءة (الباقي كتابة)
+READ_OPS = {
+    "get_values", "get_all_values", "get_all_records", "row_values", "col_values",
+    "get", "batch_get", "acell", "cell", "find", "findall", "worksheets", "worksheet",
+}
+
+# أكواد HTTP المؤقتة التي تستحق إعادة المحاولة
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+def op_kind(op):
+    return "read" if op in READ_OPS else "write"
+
+
+def backoff_delay(attempt, base=SHEETS_BACKOFF_BASE, cap=SHEETS_BACKOFF_MAX):
+    """تأخير أسي مع jitter كامل حتى لا تعيد كل الطلبات المحاولة في نفس اللحظة"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class QuotaBucket(TokenBucket):
+    """دلو رموز آمن بين الـ threads بحصة في الدقيقة"""
+
+    def __init__(self, per_minute):
+        super().__init__(per_minute / 60.0, per_minute)
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=SHEETS_QUOTA_MAX_WAIT):
+        """
+        حجز رمز والانتظار حتى يتوفر
+        يعيد False دون حجز إذا كان الانتظار أطول من max_wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self.wait_time(now)
+            if wait > max_wait:
+                return False
+            # الرصيد قد يصبح سالباً: الطلب التالي ينتظر بعدنا
+            self.consume(now)
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def pause(self, seconds):
+        with self._lock:
+            super().pause(seconds)
+
+    def remaining(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0, int(self.tokens))
+
+
+class CircuitBreaker:
+    """
+    closed: الطلبات تمر عادياً
+    open: بعد failures فشل متتالٍ تُرفض الطلبات فوراً لمدة reset_timeout
+    half_open: طلب تجريبي واحد؛ نجاحه يغلق الدائرة وفشله يفتحها من جديد
+    """
+
+    def __init__(self, failures=SHEETS_BREAKER_FAILURES, reset_timeout=SHEETS_BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._count = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """هل يُسمح بطلب الآن؟ (ينتقل إلى half_open بعد انتهاء المهلة)"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    @property
+    def available(self):
+        """مثل allow() لكن بدون استهلاك الطلب التجريبي"""
+        with self._lock:
+            return self.state == "closed" or (
+                self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout)
+
+    def release_probe(self):
+        """الطلب التجريبي لم يصل للخدمة: العودة إلى open مع السماح بتجربة جديدة فوراً"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("✅ Google Sheets متاح من جديد، إغلاق الدائرة")
+            self.state = "closed"
+            self._count = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._count += 1
+            if self.state == "half_open" or self._count >= self.failures:
+                if self.state != "open":
+                    logger.error(f"🚫 Google Sheets غير متاح بعد {self._count} فشل، "
+                                 f"إيقاف الطلبات لمدة {self.reset_timeout} ثانية")
+                self.state = "open"
+                self._opened_at = time.monotonic()
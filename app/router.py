@@ -0,0 +1,82 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Context:
+    """بيانات الرسالة الحالية كما تحتاجها الدوال"""
+
+    __slots__ = ("update", "msg", "chat_id", "text", "user", "admin")
+
+    def __init__(self, update, msg, chat_id, text, user, admin):
+        self.update = update
+        self.msg = msg
+        self.chat_id = chat_id
+        self.text = text
+        self.user = user
+        self.admin = admin
+
+
+class Router:
+    """
+    توجيه الرسائل النصية لدوالها بعملية بحث واحدة في dict
+    - نص الزر الكامل -> (handler, arg)
+    - الأوامر (/start, /addfile ...) حسب الكلمة الأولى
+    - أزرار inline (callback_query) حسب نوع العملية في callback_data
+    """
+
+    def __init__(self):
+        self._texts = {}
+        self._commands = {}
+        self._callbacks = {}
+        self._fallback = None
+
+    def text(self, *texts, arg=None):
+        def register(handler):
+            for t in texts:
+                self._texts[t] = (handler, arg)
+            return handler
+        return register
+
+    def add_texts(self, mapping, handler):
+        """تسجيل عدة أزرار لنفس الدالة: {نص الزر: arg}"""
+        for t, arg in mapping.items():
+            self._texts[t] = (handler, arg)
+
+    def command(self, *names):
+        def register(handler):
+            for name in names:
+                self._commands[name] = handler
+            return handler
+        return register
+
+    def callback(self, *actions):
+        def register(handler):
+            for action in actions:
+                self._callbacks[action] = handler
+            return handler
+        return register
+
+    def fallback(self, handler):
+        self._fallback = handler
+        return handler
+
+    async def dispatch(self, ctx):
+        route = self._texts.get(ctx.text)
+        if route is not None:
+            handler, arg = route
+            return await handler(ctx, arg)
+        if ctx.text.startswith("/"):
+            handler = self._commands.get(ctx.text.split(maxsplit=1)[0])
+            if handler is not None:
+                return await handler(ctx, None)
+        if self._fallback is not None:
+            return await self._fallback(ctx, None)
+
+    async def dispatch_callback(self, ctx, action, arg):
+        """يعيد False إذا لم تكن هناك دالة لهذه العملية"""
+        handler = self._callbacks.get(action)
+        if handler is None:
+            return False
+        await handler(ctx, arg)
+        return True
@@ -0,0 +1,231 @@
+import os
+import time
+import asyncio
+import bisect
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ===== حدود تلجرام =====
+# تقريباً 30 رسالة في الثانية لكل البوت، ورسالة واحدة في الثانية لكل محادثة
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+MAX_IN_FLIGHT = int(os.getenv("TELEGRAM_MAX_IN_FLIGHT", "20"))
+
+# ===== الأولويات (الأصغر أولاً) =====
+INTERACTIVE = 0   # ردود القوائم والرسائل
+BULK = 1          # إرسال الملفات
+
+
+class TokenBucket:
+    """دلو رموز بسيط: rate رمز في الثانية وسعة burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """عدد الثواني حتى يتوفر رمز"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, now, n=1):
+        """n رموز دفعة واحدة؛ الرصيد قد يصبح سالباً فتنتظر الطلبات التالية"""
+        self._refill(now)
+        self.tokens -= n
+
+    def pause(self, seconds):
+        """إيقاف الدلو (عند 429 مع retry_after)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.blocked_until
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "method", "payload", "chat_id", "cost",
+                 "attempts", "not_before", "future")
+
+    def __init__(self, priority, seq, method, payload, future):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.payload = payload
+        self.chat_id = payload.get("chat_id")
+        # تلجرام يحسب كل عنصر في الألبوم رسالة مستقلة ضمن حدود flood
+        self.cost = max(1, len(payload.get("media") or ())) if method == "sendMediaGroup" else 1
+        self.attempts = 0
+        self.not_before = 0.0
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendScheduler:
+    """
+    جدولة الرسائل الصادرة لتلجرام:
+    - دلو رموز عام ودلو لكل محادثة
+    - الردود التفاعلية قبل إرسال الملفات
+    - إعادة المحاولة تلقائياً مع احترام retry_after
+    """
+
+    def __init__(self, client, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, max_retries=MAX_RETRIES, max_in_flight=MAX_IN_FLIGHT):
+        self._client = client
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats = {}
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self._pending = []  # مرتبة حسب (priority, seq)
+        self._seq = itertools.count()
+        self._task = None
+        self._wakeup = None
+        self._slots = None
+        self._in_flight = 0
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+
+    # ===== التشغيل والإيقاف =====
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for job in self._pending:
+            job.future.cancel()
+        self._pending.clear()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    # ===== الإرسال =====
+    def submit(self, method, payload, priority=BULK):
+        """إضافة طلب للطابور وإرجاع Future بنتيجة تلجرام"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._push(_Job(priority, next(self._seq), method, payload, future))
+        return future
+
+    async def call(self, method, payload, priority=INTERACTIVE):
+        """إرسال وانتظار الرد"""
+        return await self.submit(method, payload, priority)
+
+    def _push(self, job):
+        bisect.insort(self._pending, job)
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    def _pick(self, now):
+        """أعلى طلب أولوية جاهز للإرسال، أو أقل زمن انتظار"""
+        min_wait = None
+        blocked = set()
+        for job in self._pending:
+            if job.chat_id in blocked:
+                continue
+            wait = max(job.not_before - now, self._chat_bucket(job.chat_id).wait_time(now))
+            if wait <= 0:
+                return job, 0
+            # الحفاظ على الترتيب داخل المحادثة الواحدة
+            blocked.add(job.chat_id)
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def _forget_idle_chats(self, now):
+        if len(self._chats) < 1000:
+            return
+        busy = {job.chat_id for job in self._pending}
+        for chat_id in [c for c, b in self._chats.items() if c not in busy and b.idle(now)]:
+            del self._chats[chat_id]
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            await self._slots.acquire()
+            now = time.monotonic()
+            self._global.consume(now, job.cost)
+            self._chat_bucket(job.chat_id).consume(now, job.cost)
+            self._pending.remove(job)
+            self._in_flight += 1
+            asyncio.get_running_loop().create_task(self._send(job))
+            self._forget_idle_chats(now)
+
+    async def _send(self, job):
+        try:
+            data = await self._client.call(job.method, job.payload)
+        except Exception as e:
+            logger.exception(f"Scheduled {job.method} failed: {e}")
+            data = {"ok": False, "description": str(e)}
+        finally:
+            self._slots.release()
+            self._in_flight -= 1
+
+        if not data.get("ok") and job.attempts < self.max_retries:
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            code = data.get("error_code")
+            # 429 أو خطأ شبكة أو خطأ من خادم تلجرام
+            if retry_after or code is None or code == 429 or code >= 500:
+                job.attempts += 1
+                delay = retry_after or min(2 ** job.attempts, 30)
+                if retry_after:
+                    # flood control قد يكون على مستوى البوت كله وليس المحادثة فقط
+                    self._chat_bucket(job.chat_id).pause(retry_after)
+                    self._global.pause(retry_after)
+                job.not_before = time.monotonic() + delay
+                self.stats["retried"] += 1
+                logger.warning(f"Retrying {job.method} to {job.chat_id} in {delay}s "
+                               f"(attempt {job.attempts})")
+                self._push(job)
+                return
+
+        self.stats["sent" if data.get("ok") else "failed"] += 1
+        if not job.future.done():
+            job.future.set_result(data)
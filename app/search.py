@@ -0,0 +1,128 @@
+import re
+import time
+import threading
+import logging
+from app.curriculum import SEMESTERS, CONTENT_TYPES
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+# كلمات إضافية لكل نوع محتوى (بالإضافة لنص الزر)
+TYPE_ALIASES = {
+    "pdf": ["pdf", "ملف", "ملفات"],
+    "video": ["video", "videos", "فيديو", "فيديوهات"],
+    "reference": ["reference", "references", "ref", "مرجع", "مراجع", "book"],
+}
+SEMESTER_LABELS = {s["id"]: s["label"] for s in SEMESTERS}
+TYPE_LABELS = dict(CONTENT_TYPES)
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def material_tokens(m):
+    """كلمات البحث لمادة واحدة: المقرر والنوع والسمستر"""
+    semester, type_ = str(m.get("semester")), str(m.get("type"))
+    tokens = set(tokenize(m.get("course", "")))
+    tokens.update(tokenize(type_))
+    tokens.update(tokenize(TYPE_LABELS.get(type_, "")))
+    tokens.update(TYPE_ALIASES.get(type_, []))
+    tokens.update(tokenize(SEMESTER_LABELS.get(semester, "")))
+    tokens.update((semester, f"s{semester}"))
+    return tokens
+
+
+class SearchIndex:
+    """
+    فهرس معكوس للمواد داخل الذاكرة: كلمة -> أرقام المواد
+    كل كلمة في الاستعلام تطابق بدايات الكلمات (anat -> anatomy) والنتيجة تقاطعها
+    """
+
+    def __init__(self, rebuild_interval=300):
+        self.rebuild_interval = rebuild_interval
+        self._materials = []      # رقم المادة -> المادة
+        self._postings = {}       # كلمة -> set(أرقام المواد)
+        self._prefixes = {}       # بداية كلمة -> set(كلمات)
+        self._seen = set()        # (semester, course, type, file_id)
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def __len__(self):
+        return len(self._materials)
+
+    # ===== البناء =====
+    def rebuild(self, materials):
+        """بناء فهرس جديد بالكامل ثم استبداله دفعة واحدة"""
+        fresh = SearchIndex(self.rebuild_interval)
+        for m in materials:
+            fresh._insert(m)
+        with self._lock:
+            self._materials, self._postings = fresh._materials, fresh._postings
+            self._prefixes, self._seen = fresh._prefixes, fresh._seen
+            self._built_at = time.time()
+        logger.info(f"🔎 Search index built with {len(fresh)} materials")
+
+    def rebuild_in_background(self, loader):
+        """إعادة البناء في thread إذا انتهت صلاحية الفهرس (مرة واحدة مهما كثرت الطلبات)"""
+        with self._lock:
+            if self._rebuilding or time.time() - self._built_at < self.rebuild_interval:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild(loader())
+            except Exception as e:
+                logger.error(f"❌ فشل إعادة بناء فهرس البحث: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+                    self._built_at = time.time()
+
+        threading.Thread(target=run, name="search-rebuild", daemon=True).start()
+
+    def add(self, semester, course, type_, file_id, created_at=None):
+        with self._lock:
+            return self._insert({"semester": str(semester), "course": course, "type": type_,
+                                 "file_id": file_id, "created_at": created_at})
+
+    def _insert(self, m):
+        marker = (str(m.get("semester")), m.get("course"), m.get("type"), m.get("file_id"))
+        if not m.get("file_id") or marker in self._seen:
+            return False
+        self._seen.add(marker)
+        material_id = len(self._materials)
+        self._materials.append(dict(m))
+        for token in material_tokens(m):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                for i in range(1, len(token) + 1):
+                    self._prefixes.setdefault(token[:i], set()).add(token)
+            postings.add(material_id)
+        return True
+
+    # ===== البحث =====
+    def search(self, query, offset=0, limit=20):
+        """
+        إرجاع (نتائج الصفحة [(رقم المادة, المادة), ...], إجمالي النتائج)
+        الأحدث أولاً؛ الاستعلام الفارغ لا يعيد شيئاً
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0
+        with self._lock:
+            matches = None
+            for token in tokens:
+                ids = set()
+                for word in self._prefixes.get(token, ()):
+                    ids |= self._postings[word]
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return [], 0
+            ordered = sorted(matches, reverse=True)
+            page = [(i, dict(self._materials[i])) for i in ordered[offset:offset + limit]]
+        return page, len(ordered)
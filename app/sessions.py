@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import collections
+
+# ===== إعدادات حالة المستخدمين =====
+# SESSION_DB غير موجود: ذاكرة العملية فقط
+# SESSION_DB=./sessions.db: ملف SQLite مشترك بين كل عمال uvicorn
+SESSION_DB = os.getenv("SESSION_DB")
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))  # ثواني
+# أقصى انتظار لقفل الكتابة في SQLite (العمليات تعمل في thread وليس داخل event loop)
+SESSION_BUSY_TIMEOUT = float(os.getenv("SESSION_BUSY_TIMEOUT", "5"))  # ثواني
+
+_MISSING = object()
+
+
+class SessionStore:
+    """
+    واجهة تشبه dict لحالة المحادثات (chat_id -> dict)
+    مع حد أقصى للعدد (LRU) ومدة صلاحية (TTL) وقياس زمن كل عملية
+    ملاحظة: القيمة المرجعة نسخة؛ أي تعديل عليها يجب حفظه بـ store[chat_id] = state
+    """
+
+    def __init__(self, name, max_size=SESSION_MAX, ttl=SESSION_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timing = collections.defaultdict(lambda: [0, 0.0])  # op -> [count, seconds]
+
+    def _timed(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            entry = self._timing[op]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    def stats(self):
+        """عدد العمليات ومتوسط زمنها بالمللي ثانية"""
+        return {
+            op: {"count": count, "avg_ms": (total / count * 1000) if count else 0.0}
+            for op, (count, total) in self._timing.items()
+        }
+
+    # ===== واجهة dict =====
+    def get(self, chat_id, default=None):
+        value = self._timed("get", self._get, str(chat_id))
+        return default if value is None else value
+
+    def __getitem__(self, chat_id):
+        value = self.get(chat_id)
+        if value is None:
+            raise KeyError(chat_id)
+        return value
+
+    def __setitem__(self, chat_id, value):
+        self._timed("set", self._set, str(chat_id), value)
+
+    def __contains__(self, chat_id):
+        return self.get(chat_id) is not None
+
+    def pop(self, chat_id, default=_MISSING):
+        value = self._timed("pop", self._pop, str(chat_id))
+        if value is None:
+            if default is _MISSING:
+                raise KeyError(chat_id)
+            return default
+        return value
+
+    # ===== واجهة async للـ handlers =====
+    async def aget(self, chat_id, default=None):
+        return self.get(chat_id, default)
+
+    async def aset(self, chat_id, value):
+        self[chat_id] = value
+
+    async def apop(self, chat_id, default=None):
+        return self.pop(chat_id, default)
+
+    # ===== التنفيذ =====
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def _pop(self, key):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """داخل ذاكرة العملية: OrderedDict مرتب حسب آخر استخدام"""
+
+    def __init__(self, name, max_size=SESSION_MAX, ttl=SESSION_TTL):
+        super().__init__(name, max_size, ttl)
+        self._data = collections.OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return json.loads(value)
+
+    def _set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, json.dumps(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def _pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] < time.time():
+            return None
+        return json.loads(entry[1])
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    ملف SQLite محلي يشترك فيه كل العمال على نفس الجهاز
+    القراءة لا تكتب شيئاً (WAL: لا تنتظر الكتابة)؛ used_at = آخر حفظ للحالة
+    الواجهة async تنفذ الطلبات في thread حتى لا يوقف انتظار القفل event loop
+    """
+
+    PURGE_EVERY = 500  # عدد عمليات الكتابة بين كل تنظيف
+
+    def __init__(self, name, path, max_size=SESSION_MAX, ttl=SESSION_TTL):
+        super().__init__(name, max_size, ttl)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " store TEXT NOT NULL, chat_id TEXT NOT NULL, data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL,"
+            " PRIMARY KEY (store, chat_id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_used ON sessions (store, used_at)")
+
+    async def aget(self, chat_id, default=None):
+        return await asyncio.to_thread(self.get, chat_id, default)
+
+    async def aset(self, chat_id, value):
+        await asyncio.to_thread(self.__setitem__, chat_id, value)
+
+    async def apop(self, chat_id, default=None):
+        return await asyncio.to_thread(self.pop, chat_id, default)
+
+    def _conn(self):
+        # اتصال لكل thread (sqlite3 لا يسمح بمشاركة الاتصال)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SESSION_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key):
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE store = ? AND chat_id = ? AND expires_at >= ?",
+            (self.name, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key, value):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (store, chat_id, data, expires_at, used_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (self.name, key, json.dumps(value), now + self.ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def _pop(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT data FROM sessions WHERE store = ? AND chat_id = ? AND expires_at >= ?",
+            (self.name, key, time.time()),
+        ).fetchone()
+        conn.execute("DELETE FROM sessions WHERE store = ? AND chat_id = ?", (self.name, key))
+        return json.loads(row[0]) if row else None
+
+    def purge(self):
+        """حذف المنتهية ثم الأقدم حفظاً فوق الحد الأقصى"""
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE store = ? AND expires_at < ?", (self.name, time.time()))
+        conn.execute(
+            "DELETE FROM sessions WHERE store = ? AND chat_id NOT IN ("
+            " SELECT chat_id FROM sessions WHERE store = ? ORDER BY used_at DESC LIMIT ?)",
+            (self.name, self.name, self.max_size),
+        )
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE store = ? AND expires_at >= ?", (self.name, time.time())
+        ).fetchone()[0]
+
+
+def create_session_store(name, path=SESSION_DB, **kwargs):
+    if path:
+        return SQLiteSessionStore(name, path, **kwargs)
+    return MemorySessionStore(name, **kwargs)
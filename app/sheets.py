@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import threading
+import logging
+import gspread
+from app.metrics import SHEETS_SECONDS, SHEETS_ERRORS, SHEETS_RETRIES, SHEETS_REJECTED
+from app.storage import StorageUnavailable
+from app.quota import (
+    QuotaBucket, CircuitBreaker, op_kind, backoff_delay, TRANSIENT_STATUS,
+    SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, SHEETS_QUOTA_MAX_WAIT, SHEETS_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# أكواد HTTP التي تعني أن المقبض (handle) لم يعد صالحاً
+STALE_STATUS = {400, 404}
+AUTH_STATUS = {401}
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_transient(error):
+    """429 أو خطأ من خادم Google أو خطأ شبكة"""
+    if isinstance(error, gspread.exceptions.APIError):
+        return _status(error) in TRANSIENT_STATUS
+    return isinstance(error, OSError)
+
+
+class SheetsUnavailable(StorageUnavailable):
+    """الحصة نفدت أو الدائرة مفتوحة؛ يُقدم آخر نسخة سليمة بدلاً من الورقة"""
+
+
+class SheetHandles:
+    """
+    فتح الـ spreadsheet مرة واحدة والاحتفاظ بمقابض الأوراق حسب الاسم
+    authorize(): دالة تعيد gspread client (تُستدعى من جديد عند انتهاء الصلاحية)
+    write_lock: يُمسك حول طلب الكتابة نفسه فقط، وليس أثناء انتظار الحصة أو إعادة المحاولة
+    """
+
+    def __init__(self, authorize, sheet_name, reads_per_minute=SHEETS_READS_PER_MINUTE,
+                 writes_per_minute=SHEETS_WRITES_PER_MINUTE, max_retries=SHEETS_MAX_RETRIES,
+                 breaker=None, write_lock=None):
+        self._authorize = authorize
+        self._write_lock = write_lock
+        self.sheet_name = sheet_name
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._lock = threading.RLock()
+        self.quota = {"read": QuotaBucket(reads_per_minute), "write": QuotaBucket(writes_per_minute)}
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+
+    # ===== المقابض =====
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._authorize()
+            return self._client
+
+    def spreadsheet(self, create=False):
+        with self._lock:
+            if self._spreadsheet is None:
+                try:
+                    self._spreadsheet = self.client().open(self.sheet_name)
+                except gspread.SpreadsheetNotFound:
+                    if not create:
+                        raise
+                    self._spreadsheet = self.client().create(self.sheet_name)
+            return self._spreadsheet
+
+    def prime(self, worksheets):
+        """تخزين مقابض أوراق جاهزة (مثلاً من spreadsheet.worksheets())"""
+        with self._lock:
+            for ws in worksheets:
+                self._worksheets[ws.title] = ws
+
+    def resolve(self, title):
+        """مقبض الورقة الخام من الذاكرة أو من الخادم"""
+        with self._lock:
+            ws = self._worksheets.get(title)
+            if ws is None:
+                ws = self._worksheets[title] = self.spreadsheet().worksheet(title)
+            return ws
+
+    def worksheet(self, title):
+        """مقبض يعيد فتح الورقة تلقائياً إذا أصبح قديماً"""
+        return WorksheetHandle(self, title)
+
+    def invalidate(self, title=None, reauthorize=False):
+        with self._lock:
+            if title is None:
+                self._worksheets.clear()
+                self._spreadsheet = None
+            else:
+                self._worksheets.pop(title, None)
+            if reauthorize:
+                self._client = None
+                self._spreadsheet = None
+                self._worksheets.clear()
+
+    # ===== التنفيذ مع إعادة المحاولة =====
+    def _timed(self, title, op, fn, create=False):
+        """title=None: fn تُستدعى على الـ spreadsheet نفسه بدل ورقة"""
+        label = title or "spreadsheet"
+        try:
+            with SHEETS_SECONDS.time(label, op):
+                return fn(self.spreadsheet(create) if title is None else self.resolve(title))
+        except Exception:
+            SHEETS_ERRORS.inc(label, op)
+            raise
+
+    def _call_once(self, title, fn, op, create=False):
+        """
+        تنفيذ fn(worksheet)؛ إذا كان المقبض قديماً أو انتهت صلاحية الاعتماد
+        يُعاد فتح الورقة مرة واحدة ثم تُعاد المحاولة
+        """
+        label = title or "spreadsheet"
+        try:
+            return self._timed(title, op, fn, create)
+        except (gspread.WorksheetNotFound, gspread.SpreadsheetNotFound) as e:
+            logger.warning(f"Stale handle for '{label}', reopening: {e}")
+            self.invalidate()
+        except gspread.exceptions.APIError as e:
+            status = _status(e)
+            if status in AUTH_STATUS:
+                logger.warning(f"Sheets credentials rejected, re-authorizing: {e}")
+                self.invalidate(reauthorize=True)
+            elif status in STALE_STATUS:
+                logger.warning(f"Stale handle for '{label}' ({status}), reopening: {e}")
+                self.invalidate()
+            else:
+                raise
+        return self._timed(title, op, fn, create)
+
+    def call(self, title, fn, op="call", create=False):
+        """
+        تنفيذ fn(worksheet) ضمن حصة القراءة/الكتابة
+        الأخطاء المؤقتة (429/5xx) تُعاد بتأخير أسي، وتكرار فشلها يفتح الدائرة
+        فتح الـ spreadsheet ومقبض الورقة (resolve) يتمان داخل المحاولة أيضاً
+        """
+        label = title or "spreadsheet"
+        if not self.breaker.allow():
+            SHEETS_REJECTED.inc("circuit_open")
+            raise SheetsUnavailable(f"Google Sheets circuit open ({label}.{op})")
+
+        bucket = self.quota[op_kind(op)]
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                if not bucket.acquire(SHEETS_QUOTA_MAX_WAIT):
+                    SHEETS_REJECTED.inc("quota")
+                    raise SheetsUnavailable(f"Google Sheets {op_kind(op)} quota exhausted ({label}.{op})")
+                try:
+                    if self._write_lock is not None and op_kind(op) == "write":
+                        with self._write_lock:
+                            result = self._call_once(title, fn, op, create)
+                    else:
+                        result = self._call_once(title, fn, op, create)
+                except Exception as e:
+                    if not is_transient(e):
+                        # خطأ في الطلب نفسه وليس في الخدمة
+                        settled = True
+                        self.breaker.record_success()
+                        raise
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        settled = True
+                        self.breaker.record_failure()
+                        raise
+                    delay = backoff_delay(attempt)
+                    if _status(e) == 429:
+                        # الطلبات الأخرى تنتظر أيضاً بدل استهلاك الحصة بلا فائدة
+                        bucket.pause(delay)
+                    SHEETS_RETRIES.inc(label, op)
+                    logger.warning(f"Sheets {label}.{op} failed ({e}), retry {attempt} in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+                settled = True
+                self.breaker.record_success()
+                return result
+        finally:
+            if not settled:
+                # الطلب انتهى دون حكم على الخدمة (مثلاً رفضته الحصة المحلية):
+                # إذا كان هو الطلب التجريبي نعيد الفرصة للطلب التالي بدل البقاء في half_open
+                self.breaker.release_probe()
+
+    def call_spreadsheet(self, fn, op, create=False):
+        """تنفيذ fn(spreadsheet) عبر نفس الحصة وإعادة المحاولة والدائرة"""
+        return self.call(None, fn, op=op, create=create)
+
+    @property
+    def available(self):
+        return self.breaker.available
+
+    def quota_status(self):
+        """الرصيد المتبقي من كل حصة وحالة الدائرة"""
+        return {
+            "read_remaining": self.quota["read"].remaining(),
+            "write_remaining": self.quota["write"].remaining(),
+            "circuit": self.breaker.state,
+        }
+
+
+class WorksheetHandle:
+    """واجهة مطابقة لـ gspread.Worksheet تمر كل استدعاءاتها عبر SheetHandles.call"""
+
+    def __init__(self, handles, title):
+        self._handles = handles
+        self.title = title
+
+    def __getattr__(self, name):
+        # بدون أي طلب للخادم هنا: فتح الورقة يتم داخل call()
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self._handles.call(self.title, lambda ws: getattr(ws, name)(*args, **kwargs), op=name)
+        return method
+
+
+class SchemaCache:
+    """
+    ملف محلي بآخر رؤوس أوراق تم التحقق منها
+    إذا لم تتغير الأعمدة المتوقعة يُتخطى فحص الرؤوس عند الإقلاع (حتى ttl ثانية)
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write schema cache {self.path}: {e}")
+
+    def valid(self, sheet_name, schema):
+        entry = self._read().get(sheet_name)
+        return (entry is not None and entry.get("schema") == schema
+                and time.time() - entry.get("checked_at", 0) < self.ttl)
+
+    def remember(self, sheet_name, schema):
+        with self._lock:
+            data = self._read()
+            data[sheet_name] = {"schema": schema, "checked_at": time.time()}
+            self._write(data)
+
+    def forget(self, sheet_name):
+        with self._lock:
+            data = self._read()
+            if data.pop(sheet_name, None) is not None:
+                self._write(data)
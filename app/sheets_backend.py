@@ -0,0 +1,212 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import json
+import gspread
+from google.oauth2.service_account import Credentials
+from datetime import datetime
+from app.storage import StorageBackend
+from app.catalog import MaterialsCatalog, MATERIAL_COLUMNS
+from app.writebehind import WriteBehindBuffer
+from app.waiting import WaitingFilesStore, WAITING_COLUMNS
+from app.sheets import SheetHandles, SheetsUnavailable, SchemaCache
+
+# ===== إعداد Google Sheets =====
+GOOGLE_SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME", "MedBot Files")
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+SERVICE_ACCOUNT_JSON = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
+CACHE_TTL = 60  # ثواني
+
+# ===== كتابة مؤجلة للمواد (append_rows دفعة واحدة) =====
+MATERIALS_JOURNAL = os.getenv("MATERIALS_JOURNAL", "./materials_journal.jsonl")
+MATERIALS_FLUSH_ROWS = int(os.getenv("MATERIALS_FLUSH_ROWS", "50"))
+MATERIALS_FLUSH_SECONDS = float(os.getenv("MATERIALS_FLUSH_SECONDS", "5"))
+
+# ===== رؤوس الأوراق (فحصها يُحفظ محلياً لتسريع الإقلاع) =====
+SCHEMA = {"materials": MATERIAL_COLUMNS, "waiting_files": WAITING_COLUMNS}
+SHEET_ROWS = {"materials": 5000, "waiting_files": 1000}
+SCHEMA_CACHE_PATH = os.getenv("SHEETS_SCHEMA_CACHE", "./sheets_schema.json")
+SCHEMA_CACHE_TTL = float(os.getenv("SHEETS_SCHEMA_CACHE_TTL", "86400"))
+
+
+class SheetsBackend(StorageBackend):
+    """التخزين في Google Sheets مع فهرس للمواد والملفات المؤقتة داخل الذاكرة"""
+
+    name = "sheets"
+
+    def __init__(self, sheet_name=GOOGLE_SHEET_NAME, service_account_json=SERVICE_ACCOUNT_JSON,
+                 lock=None, journal_path=MATERIALS_JOURNAL, authorize=None):
+        """authorize: دالة بديلة تعيد gspread client (مثلاً نسخة وهمية للاختبار)"""
+        if authorize is None:
+            if not service_account_json:
+                raise ValueError("❌ متغير البيئة GOOGLE_SERVICE_ACCOUNT_JSON غير موجود!")
+
+            # قراءة الاعتماد والاتصال بـ Google عند أول طلب فقط وليس عند الاستيراد
+            def authorize():
+                creds_info = json.loads(service_account_json)
+                credentials = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+                return gspread.authorize(credentials)
+
+        # 🔒 قفل لتفادي التداخل بين طلبات الكتابة (لا يُمسك أثناء انتظار الحصة)
+        self.lock = lock or threading.Lock()
+
+        # مقابض مفتوحة مرة واحدة بدل client.open في كل عملية
+        self.handles = SheetHandles(authorize, sheet_name, write_lock=self.lock)
+        self.materials_sheet = self.handles.worksheet("materials")
+        self.waiting_sheet = self.handles.worksheet("waiting_files")
+
+        self.catalog = MaterialsCatalog(self._load_material_rows, refresh_interval=CACHE_TTL,
+                                        pending=lambda: self.material_writer.pending_rows())
+        self.material_writer = WriteBehindBuffer(
+            self._append_material_rows, journal_path,
+            max_rows=MATERIALS_FLUSH_ROWS, max_delay=MATERIALS_FLUSH_SECONDS,
+        )
+        # قفل خاص بفهرس الصفوف: انتظار الحصة هنا لا يوقف بقية الطلبات
+        self.waiting_store = WaitingFilesStore(lambda: self.waiting_sheet)
+        self.schema_cache = SchemaCache(SCHEMA_CACHE_PATH, ttl=SCHEMA_CACHE_TTL)
+
+    # ===== فهرس المواد داخل الذاكرة =====
+    def _load_material_rows(self, start_row):
+        """قراءة صفوف materials ابتداءً من start_row فقط (القراءة لا تحتاج القفل العام)"""
+        return self.materials_sheet.get_values(f"A{start_row}:E")
+
+    def _append_material_rows(self, rows):
+        self.materials_sheet.append_rows(rows)
+
+    # ===== تهيئة الورقة =====
+    def _ensure_sheet(self, titles, title):
+        """إنشاء الورقة أو تصحيح صف العناوين إذا لم يطابق الأعمدة المتوقعة"""
+        columns = SCHEMA[title]
+        sheet = self.handles.worksheet(title)
+        if title not in titles:
+            created = self.handles.call_spreadsheet(
+                lambda s: s.add_worksheet(title=title, rows=SHEET_ROWS[title], cols=len(columns)),
+                op="add_worksheet")
+            self.handles.prime([created])
+            sheet.append_row(columns)
+            return
+        header = sheet.row_values(1)
+        if header[: len(columns)] != columns:
+            try:
+                sheet.delete_rows(1)
+            except Exception:
+                pass
+            sheet.insert_row(columns, 1)
+
+    def check_schema(self):
+        """فتح الـ spreadsheet وفحص رؤوس الورقتين بالتوازي (يرفع الخطأ إذا فشل)"""
+        worksheets = self.handles.call_spreadsheet(lambda s: s.worksheets(), op="worksheets", create=True)
+        self.handles.prime(worksheets)
+        titles = [s.title for s in worksheets]
+        with ThreadPoolExecutor(len(SCHEMA)) as pool:
+            for future in [pool.submit(self._ensure_sheet, titles, t) for t in SCHEMA]:
+                future.result()
+        self.schema_cache.remember(self.handles.sheet_name, SCHEMA)
+        print("✅ Google Sheet جاهز للاستخدام")
+
+    def _load_all(self):
+        """تحميل فهرس المواد والملفات المؤقتة بالتوازي؛ فشل أي منهما يرفع خطأ"""
+        with ThreadPoolExecutor(2) as pool:
+            catalog_loaded = pool.submit(self.catalog.refresh, True)
+            waiting_loaded = pool.submit(self.waiting_store.load)
+            loaded = catalog_loaded.result()
+            waiting_loaded.result()
+        if not loaded:
+            raise SheetsUnavailable("❌ تعذر تحميل فهرس المواد من Google Sheets")
+
+    def init_db(self):
+        """
+        فحص الرؤوس يُتخطى إذا كان محفوظاً من تشغيل سابق
+        ثم تحميل فهرس المواد والملفات المؤقتة بالتوازي
+        يرفع خطأ إذا فشل التحميل حتى تُعاد المحاولة قبل إعلان الجاهزية
+        """
+        cached = self.schema_cache.valid(self.handles.sheet_name, SCHEMA)
+        if not cached:
+            self.check_schema()
+
+        try:
+            self._load_all()
+        except Exception as e:
+            if not cached:
+                raise
+            # ربما تغيرت الورقة منذ آخر فحص
+            print(f"❌ خطأ أثناء التحميل، إعادة فحص الرؤوس: {e}")
+            self.schema_cache.forget(self.handles.sheet_name)
+            self.check_schema()
+            self._load_all()
+
+        # الصفوف المعلقة من التشغيل السابق: نحذف ما وصل للورقة فقط (الباقي في الفهرس عبر pending)
+        self.material_writer.retain(lambda row: not self.catalog.in_sheet(*row[:4]))
+        self.material_writer.start()
+
+    def close(self):
+        """كتابة كل الصفوف المعلقة (عند إيقاف التطبيق)"""
+        self.material_writer.stop()
+
+    def health(self):
+        return {**self.handles.quota_status(), "pending_rows": len(self.material_writer)}
+
+    # ========== مواد دائمة ==========
+    def add_material(self, semester, course, type_, file_id, created_at=None):
+        """
+        الصف يُحفظ في الـ journal ويظهر في الفهرس فوراً، ويُكتب في الورقة لاحقاً مع غيره
+        """
+        created_at = created_at or datetime.utcnow().isoformat()
+        row = [semester, course, type_, file_id, created_at]
+        self.material_writer.add(row)
+        self.catalog.add(*row)
+
+    def add_materials(self, rows):
+        """الفهرس يستبعد المكرر، والجديد يُكتب بطلبات append_rows مجمعة"""
+        if not self.catalog.loaded:
+            raise SheetsUnavailable("Materials catalog not loaded yet; cannot check for duplicates")
+        created_at = datetime.utcnow().isoformat()
+        new = []
+        for semester, course, type_, file_id, *rest in rows:
+            row = [semester, course, type_, file_id, (rest[0] if rest else None) or created_at]
+            if self.catalog.add(*row):
+                new.append(row)
+        self.material_writer.extend(new)
+        return len(new)
+
+    def get_materials(self, semester, course, type_, use_cache=False):
+        """
+        use_cache=True: لا يُقرأ من الورقة إلا إذا انتهت صلاحية الفهرس
+        use_cache=False: قراءة الصفوف الجديدة فقط قبل الإجابة
+        Google Sheets غير متاح: الإجابة من آخر نسخة سليمة للفهرس
+        لا توجد نسخة بعد: SheetsUnavailable بدل قائمة فارغة (حتى لا تُخزن كنتيجة صحيحة)
+        """
+        if self.handles.available:
+            if use_cache:
+                self.catalog.ensure_fresh()
+            else:
+                self.catalog.refresh()
+        if not self.catalog.loaded:
+            raise SheetsUnavailable("Google Sheets unavailable and no materials snapshot yet")
+        return self.catalog.lookup(semester, course, type_)
+
+    def iter_materials(self):
+        self.catalog.ensure_fresh()
+        return self.catalog.iter_materials()
+
+    # ======= الملفات المؤقتة =======
+    def set_waiting_file(self, chat_id, flag):
+        if not flag:
+            self.waiting_store.delete(chat_id)
+        elif not self.waiting_store.exists(chat_id):
+            self.waiting_store.set(chat_id)
+
+    def set_waiting_file_fileid(self, chat_id, file_id, type_, semester=None):
+        self.waiting_store.set(chat_id, file_id, type_, semester or "")
+
+    def set_waiting_file_semester(self, chat_id, semester):
+        self.waiting_store.update(chat_id, semester=semester)
+
+    def is_waiting_file(self, chat_id):
+        return self.waiting_store.exists(chat_id)
+
+    def get_waiting_file(self, chat_id):
+        return self.waiting_store.get(chat_id)
@@ -0,0 +1,236 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import (
+    create_engine, MetaData, Table, Column, Integer, String, Index,
+    select, insert, update, delete, func,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from app.storage import StorageBackend
+from app.catalog import MATERIAL_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# كل كم ثانية تُستورد المواد المضافة في الورقة مباشرة (0 = بدون استيراد)
+MIRROR_SYNC_SECONDS = float(os.getenv("MIRROR_SYNC_SECONDS", "60"))
+
+metadata = MetaData()
+
+# نفس أعمدة ورقة materials
+materials = Table(
+    "materials", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("semester", String(16), nullable=False),
+    Column("course", String(64), nullable=False),
+    Column("type", String(16), nullable=False),
+    Column("file_id", String(256), nullable=False),
+    Column("created_at", String(32)),
+    # يغطي البحث بـ (semester, course, type) ويمنع تكرار نفس الملف
+    Index("ix_materials_key_file", "semester", "course", "type", "file_id", unique=True),
+)
+
+# نفس أعمدة ورقة waiting_files
+waiting_files = Table(
+    "waiting_files", metadata,
+    Column("chat_id", String(32), primary_key=True),
+    Column("file_id", String(256), nullable=False, default=""),
+    Column("type", String(16), nullable=False, default=""),
+    Column("semester", String(16), nullable=False, default=""),
+)
+
+
+def _material(row):
+    return {"semester": row.semester, "course": row.course, "type": row.type,
+            "file_id": row.file_id, "created_at": row.created_at}
+
+
+def _marker(m):
+    return tuple(str(m.get(k) or "") for k in ("semester", "course", "type", "file_id"))
+
+
+class SQLBackend(StorageBackend):
+    """
+    التخزين في قاعدة بيانات محلية (SQLite افتراضياً) عبر SQLAlchemy
+    mirror: backend اختياري (Google Sheets) تُنسخ إليه المواد الجديدة
+    المواد المضافة في الورقة مباشرة تُستورد كل sync_interval ثانية
+    (تعديل أو حذف صف في الورقة لا ينعكس على قاعدة البيانات)
+    """
+
+    name = "sql"
+
+    def __init__(self, database_url, mirror=None, sync_interval=MIRROR_SYNC_SECONDS):
+        kwargs = {}
+        if database_url.startswith("sqlite"):
+            kwargs["connect_args"] = {"check_same_thread": False}
+            if database_url in ("sqlite://", "sqlite:///:memory:"):
+                kwargs["poolclass"] = StaticPool
+        self.engine = create_engine(database_url, **kwargs)
+        self.mirror = mirror
+        self.sync_interval = sync_interval
+        self._known = set()       # مواد موجودة في قاعدة البيانات (لاستبعادها عند الاستيراد من الورقة)
+        self._synced_at = 0.0
+        self._syncing = False
+        self._sync_lock = threading.Lock()
+
+    def init_db(self):
+        metadata.create_all(self.engine)
+        if self.mirror is None:
+            return
+        try:
+            self.mirror.init_db()
+        except Exception as e:
+            logger.error(f"❌ خطأ أثناء تهيئة نسخة Google Sheets: {e}")
+            return
+        # قاعدة بيانات جديدة: نبدأ من محتوى الورقة
+        with self.engine.begin() as conn:
+            empty = conn.execute(select(func.count()).select_from(materials)).scalar() == 0
+        if empty:
+            added = self._insert_materials(self.mirror.iter_materials())
+            logger.info(f"✅ تم استيراد {len(added)} مادة من Google Sheets")
+        self._known = {_marker(m) for m in self.iter_materials()}
+        self._synced_at = time.time()
+
+    # ===== استيراد إضافات الورقة =====
+    def pull_mirror(self):
+        """إدخال مواد الورقة غير الموجودة في قاعدة البيانات؛ يعيد عدد الجديد"""
+        candidates = [m for m in self.mirror.iter_materials() if _marker(m) not in self._known]
+        if not candidates:
+            return 0
+        added = self._insert_materials(candidates)
+        # المكرر هنا أضافه عامل آخر لنفس قاعدة البيانات
+        self._known.update(_marker(m) for m in candidates)
+        if added:
+            logger.info(f"✅ تم استيراد {len(added)} مادة جديدة من Google Sheets")
+        return len(added)
+
+    def _pull_mirror_in_background(self):
+        """استيراد في thread مرة كل sync_interval (مرة واحدة مهما كثرت الطلبات)"""
+        if self.mirror is None or not self.sync_interval:
+            return
+        with self._sync_lock:
+            if self._syncing or time.time() - self._synced_at < self.sync_interval:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                self.pull_mirror()
+            except Exception as e:
+                logger.error(f"❌ خطأ أثناء الاستيراد من Google Sheets: {e}")
+            finally:
+                with self._sync_lock:
+                    self._syncing = False
+                    self._synced_at = time.time()
+
+        threading.Thread(target=run, name="mirror-sync", daemon=True).start()
+
+    def close(self):
+        if self.mirror is not None:
+            self.mirror.close()
+        self.engine.dispose()
+
+    def health(self):
+        return self.mirror.health() if self.mirror is not None else {}
+
+    def _mirror(self, method, *args):
+        if self.mirror is None:
+            return
+        try:
+            getattr(self.mirror, method)(*args)
+        except Exception as e:
+            logger.error(f"❌ خطأ أثناء النسخ إلى Google Sheets ({method}): {e}")
+
+    # ========== مواد دائمة ==========
+    def _insert_materials(self, rows):
+        """إدخال صفوف مع تجاهل المكرر؛ يعيد الصفوف الجديدة فقط"""
+        added = []
+        with self.engine.begin() as conn:
+            for m in rows:
+                values = {k: str(m.get(k) or "") for k in ("semester", "course", "type", "file_id")}
+                values["created_at"] = m.get("created_at") or datetime.utcnow().isoformat()
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(materials).values(**values))
+                    added.append(values)
+                except IntegrityError:
+                    pass
+        self._known.update(_marker(m) for m in added)
+        return added
+
+    def add_material(self, semester, course, type_, file_id, created_at=None):
+        created_at = created_at or datetime.utcnow().isoformat()
+        added = self._insert_materials([{"semester": semester, "course": course, "type": type_,
+                                         "file_id": file_id, "created_at": created_at}])
+        if added:
+            self._mirror("add_material", semester, course, type_, file_id, created_at)
+
+    def add_materials(self, rows):
+        added = self._insert_materials([
+            {"semester": r[0], "course": r[1], "type": r[2], "file_id": r[3],
+             "created_at": r[4] if len(r) > 4 else None}
+            for r in rows
+        ])
+        if added:
+            self._mirror("add_materials", [[m[c] for c in MATERIAL_COLUMNS] for m in added])
+        return len(added)
+
+    def get_materials(self, semester, course, type_, use_cache=False):
+        self._pull_mirror_in_background()
+        query = (
+            select(materials)
+            .where(materials.c.semester == str(semester),
+                   materials.c.course == str(course),
+                   materials.c.type == str(type_))
+            .order_by(materials.c.id)
+        )
+        with self.engine.connect() as conn:
+            return [_material(row) for row in conn.execute(query)]
+
+    def iter_materials(self):
+        """قراءة الجدول على دفعات بدل تحميله كاملاً في الذاكرة"""
+        query = select(materials).order_by(materials.c.id).execution_options(yield_per=500)
+        with self.engine.connect() as conn:
+            for row in conn.execute(query):
+                yield _material(row)
+
+    # ======= الملفات المؤقتة =======
+    def set_waiting_file(self, chat_id, flag):
+        with self.engine.begin() as conn:
+            if not flag:
+                conn.execute(delete(waiting_files).where(waiting_files.c.chat_id == str(chat_id)))
+                return
+            exists = conn.execute(
+                select(waiting_files.c.chat_id).where(waiting_files.c.chat_id == str(chat_id))
+            ).first()
+            if not exists:
+                conn.execute(insert(waiting_files).values(chat_id=str(chat_id)))
+
+    def set_waiting_file_fileid(self, chat_id, file_id, type_, semester=None):
+        values = {"file_id": file_id or "", "type": type_ or "", "semester": semester or ""}
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(waiting_files).where(waiting_files.c.chat_id == str(chat_id)).values(**values)
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(waiting_files).values(chat_id=str(chat_id), **values))
+
+    def set_waiting_file_semester(self, chat_id, semester):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(waiting_files).where(waiting_files.c.chat_id == str(chat_id))
+                .values(semester=semester or "")
+            )
+
+    def is_waiting_file(self, chat_id):
+        return self.get_waiting_file(chat_id) is not None
+
+    def get_waiting_file(self, chat_id):
+        query = select(waiting_files).where(waiting_files.c.chat_id == str(chat_id))
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+        if row is None:
+            return None
+        return {"file_id": row.file_id, "type": row.type, "semester": row.semester}
@@ -0,0 +1,81 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ===== اختيار طريقة التخزين =====
+# DATABASE_URL موجود: SQLite/SQLAlchemy محلياً (مع نسخة في Google Sheets إذا SHEETS_MIRROR=1،
+# تُستورد منها الصفوف المضافة يدوياً فقط، انظر SQLBackend)
+# DATABASE_URL غير موجود: Google Sheets مباشرة
+DATABASE_URL = os.getenv("DATABASE_URL")
+SHEETS_MIRROR = os.getenv("SHEETS_MIRROR", "").lower() in ("1", "true", "yes")
+
+
+class StorageUnavailable(Exception):
+    """مصدر البيانات غير متاح مؤقتاً (ولا توجد نسخة محفوظة للإجابة منها)"""
+
+
+class StorageBackend:
+    """الواجهة التي تعتمد عليها crud؛ كل طريقة تخزين تنفذ هذه الدوال"""
+
+    name = "base"
+
+    def init_db(self):
+        raise NotImplementedError
+
+    def close(self):
+        """كتابة أي بيانات معلقة عند إيقاف التطبيق"""
+
+    def health(self):
+        """حالة مصدر البيانات (مثلاً الحصة المتبقية في Google Sheets)"""
+        return {}
+
+    # ===== مواد دائمة =====
+    def add_material(self, semester, course, type_, file_id, created_at=None):
+        raise NotImplementedError
+
+    def add_materials(self, rows):
+        """
+        إضافة دفعة مواد: rows = [(semester, course, type, file_id, created_at), ...]
+        المكرر يُتجاهل؛ يعيد عدد المواد الجديدة
+        """
+        raise NotImplementedError
+
+    def get_materials(self, semester, course, type_, use_cache=False):
+        raise NotImplementedError
+
+    def iter_materials(self):
+        """كل المواد (للتصدير وبناء الفهارس)؛ قد تكون generator"""
+        raise NotImplementedError
+
+    # ===== الملفات المؤقتة =====
+    def set_waiting_file(self, chat_id, flag):
+        raise NotImplementedError
+
+    def set_waiting_file_fileid(self, chat_id, file_id, type_, semester=None):
+        raise NotImplementedError
+
+    def set_waiting_file_semester(self, chat_id, semester):
+        raise NotImplementedError
+
+    def is_waiting_file(self, chat_id):
+        raise NotImplementedError
+
+    def get_waiting_file(self, chat_id):
+        raise NotImplementedError
+
+
+def create_backend(database_url=DATABASE_URL, mirror=SHEETS_MIRROR, lock=None):
+    """إنشاء الـ backend المناسب حسب متغيرات البيئة"""
+    if database_url:
+        from app.sql_backend import SQLBackend
+        sheets = None
+        if mirror:
+            from app.sheets_backend import SheetsBackend
+            sheets = SheetsBackend(lock=lock)
+        logger.info(f"Storage backend: sql ({database_url}){' + sheets mirror' if sheets else ''}")
+        return SQLBackend(database_url, mirror=sheets)
+
+    from app.sheets_backend import SheetsBackend
+    logger.info("Storage backend: google sheets")
+    return SheetsBackend(lock=lock)
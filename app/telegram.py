@@ -0,0 +1,80 @@
+import os
+import logging
+import httpx
+from app.metrics import TELEGRAM_SECONDS, TELEGRAM_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# ===== إعدادات الاتصال بـ Telegram Bot API =====
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "15"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "20"))
+
+
+class TelegramClient:
+    """
+    عميل غير متزامن لـ Bot API يحتفظ باتصالات مفتوحة (connection pool)
+    كل الدوال تعيد رد تلجرام كـ dict ولا ترمي استثناءات شبكة
+    """
+
+    def __init__(self, token, base_url=TELEGRAM_API_BASE, timeout=TELEGRAM_TIMEOUT,
+                 connect_timeout=TELEGRAM_CONNECT_TIMEOUT, pool_size=TELEGRAM_POOL_SIZE):
+        self.api_url = f"{base_url}/bot{token}"
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=pool_size,
+                                    max_keepalive_connections=pool_size)
+        self._client = None
+
+    def _http(self):
+        # إنشاء الـ pool عند أول استخدام حتى يعمل العميل قبل حدث startup أيضاً
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def call(self, method, payload, timeout=None):
+        """
+        استدعاء أي دالة من Bot API
+        timeout: مهلة القراءة لهذا الطلب فقط (مثلاً getUpdates مع long polling)
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self._timeout.connect)
+        try:
+            with TELEGRAM_SECONDS.time(method):
+                r = await self._http().post(f"{self.api_url}/{method}", json=payload, **kwargs)
+        except httpx.HTTPError as e:
+            logger.exception(f"Telegram {method} failed: {e}")
+            TELEGRAM_ERRORS.inc(method, "network")
+            return {"ok": False, "description": str(e)}
+        try:
+            data = r.json()
+        except ValueError:
+            data = {"ok": False, "error_code": r.status_code, "description": r.text}
+        if data.get("ok"):
+            logger.debug(f"Telegram {method} status: {r.status_code}")
+        else:
+            logger.warning(f"Telegram {method} status: {r.status_code}, response: {data}")
+            TELEGRAM_ERRORS.inc(method, data.get("error_code", r.status_code))
+        return data
+
+    # ===== دوال الإرسال =====
+    async def send_message(self, chat_id, text, reply_markup=None):
+        payload = {"chat_id": chat_id, "text": text}
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        return await self.call("sendMessage", payload)
+
+    async def send_document(self, chat_id, document):
+        return await self.call("sendDocument", {"chat_id": chat_id, "document": document})
+
+    async def send_video(self, chat_id, video):
+        return await self.call("sendVideo", {"chat_id": chat_id, "video": video})
+
+    async def send_media_group(self, chat_id, media):
+        return await self.call("sendMediaGroup", {"chat_id": chat_id, "media": media})
@@ -0,0 +1,116 @@
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ترتيب الأعمدة في ورقة waiting_files (يثبّته init_db)
+WAITING_COLUMNS = ["chat_id", "file_id", "type", "semester"]
+_COLUMN_LETTERS = {"chat_id": "A", "file_id": "B", "type": "C", "semester": "D"}
+_ROW_IN_RANGE = re.compile(r"![A-Z]+(\d+)")
+
+
+class WaitingFilesStore:
+    """
+    حالة الملفات المؤقتة للأدمن مع فهرس chat_id -> رقم الصف داخل الذاكرة
+    القراءة من الذاكرة فقط، وكل تعديل = طلب واحد للورقة
+    worksheet(): دالة تعيد ورقة waiting_files
+    """
+
+    def __init__(self, worksheet, lock=None):
+        self._worksheet = worksheet
+        self._lock = lock or threading.Lock()
+        self._rows = {}     # chat_id -> {"row": n, "file_id":..., "type":..., "semester":...}
+        self._last_row = 1  # صف العناوين
+        self._loaded = False
+
+    # ===== التحميل =====
+    def load(self):
+        """قراءة الورقة مرة واحدة وبناء الفهرس"""
+        with self._lock:
+            values = self._worksheet().get_values()
+            rows = {}
+            for i, row in enumerate(values[1:], start=2):
+                record = dict(zip(WAITING_COLUMNS, list(row) + [""] * len(WAITING_COLUMNS)))
+                chat_id = str(record.pop("chat_id")).strip()
+                if chat_id:
+                    rows[chat_id] = {"row": i, **record}
+            self._rows = rows
+            self._last_row = max(1, len(values))
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    # ===== القراءة =====
+    def exists(self, chat_id):
+        self._ensure_loaded()
+        return str(chat_id) in self._rows
+
+    def get(self, chat_id):
+        self._ensure_loaded()
+        entry = self._rows.get(str(chat_id))
+        if entry is None:
+            return None
+        return {"file_id": entry["file_id"], "type": entry["type"], "semester": entry["semester"]}
+
+    def __len__(self):
+        return len(self._rows)
+
+    # ===== الكتابة =====
+    def set(self, chat_id, file_id="", type_="", semester=""):
+        """إضافة أو تحديث صف المحادثة بطلب واحد"""
+        self._ensure_loaded()
+        key = str(chat_id)
+        values = [chat_id, file_id or "", type_ or "", semester or ""]
+        with self._lock:
+            sheet = self._worksheet()
+            entry = self._rows.get(key)
+            if entry is not None:
+                row = entry["row"]
+                sheet.batch_update([{"range": f"A{row}:D{row}", "values": [values]}])
+            else:
+                response = sheet.append_row(values)
+                row = self._appended_row(response)
+            self._rows[key] = {"row": row, "file_id": values[1], "type": values[2], "semester": values[3]}
+            self._last_row = max(self._last_row, row)
+
+    def update(self, chat_id, **fields):
+        """تحديث أعمدة محددة لصف موجود فقط"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._rows.get(str(chat_id))
+            if entry is None:
+                return False
+            row = entry["row"]
+            data = [{"range": f"{_COLUMN_LETTERS[name]}{row}", "values": [[value or ""]]}
+                    for name, value in fields.items()]
+            self._worksheet().batch_update(data)
+            for name, value in fields.items():
+                entry[name] = value or ""
+            return True
+
+    def delete(self, chat_id):
+        """حذف صف المحادثة وإزاحة أرقام الصفوف التي بعده"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._rows.get(str(chat_id))
+            if entry is None:
+                return False
+            row = entry["row"]
+            self._worksheet().delete_rows(row)
+            del self._rows[str(chat_id)]
+            for other in self._rows.values():
+                if other["row"] > row:
+                    other["row"] -= 1
+            self._last_row -= 1
+            return True
+
+    def _appended_row(self, response):
+        """رقم الصف من رد append_row، أو الصف التالي المتوقع"""
+        try:
+            updated = response["updates"]["updatedRange"]
+            return int(_ROW_IN_RANGE.search(updated).group(1))
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return self._last_row + 1
@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    تجميع الصفوف وكتابتها دفعة واحدة (append_rows) عند بلوغ حد الحجم أو الزمن
+    الصفوف المعلقة تُحفظ في ملف journal محلي حتى لا تضيع عند إعادة التشغيل
+    flush_fn(rows): دالة تكتب قائمة صفوف في الورقة
+    """
+
+    def __init__(self, flush_fn, journal_path, max_rows=50, max_delay=5.0):
+        self._flush_fn = flush_fn
+        self.journal_path = journal_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._load_journal()
+
+    # ===== ملف الـ journal =====
+    def _load_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    self._rows.append(json.loads(line))
+        if self._rows:
+            logger.info(f"♻️ استرجاع {len(self._rows)} صف معلق من {self.journal_path}")
+
+    def _append_journal(self, rows):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_journal(self):
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in self._rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.journal_path)
+
+    # ===== الإضافة =====
+    def add(self, row):
+        """حفظ الصف في الـ journal وإرجاع التحكم فوراً"""
+        self.extend([row])
+
+    def extend(self, rows):
+        rows = [list(r) for r in rows]
+        if not rows:
+            return
+        with self._lock:
+            # fsync واحد للدفعة كاملة
+            self._append_journal(rows)
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            if self._thread is not None and self._thread.is_alive():
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def pending_rows(self):
+        with self._lock:
+            return [list(r) for r in self._rows]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+    def retain(self, predicate):
+        """إبقاء الصفوف التي تحقق الشرط فقط (مثلاً: غير الموجودة في الورقة)"""
+        with self._flush_lock, self._lock:
+            kept = [r for r in self._rows if predicate(r)]
+            if len(kept) != len(self._rows):
+                self._rows = kept
+                self._rewrite_journal()
+
+    # ===== الكتابة في الورقة =====
+    def flush(self):
+        """كتابة كل الصفوف المعلقة بطلب واحد"""
+        with self._flush_lock:
+            with self._lock:
+                batch = [list(r) for r in self._rows]
+            if not batch:
+                return True
+            try:
+                self._flush_fn(batch)
+            except Exception as e:
+                logger.error(f"❌ فشل كتابة {len(batch)} صف، ستُعاد المحاولة: {e}")
+                return False
+            with self._lock:
+                # الصفوف المضافة أثناء الكتابة تبقى للدفعة التالية
+                self._rows = self._rows[len(batch):]
+                self._rewrite_journal()
+            logger.info(f"✅ تمت كتابة {len(batch)} صف دفعة واحدة")
+            return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay + 30)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            if len(self):
+                self.flush()
@@ -0,0 +1,191 @@
+"""نسخة وهمية من gspread داخل الذاكرة مع زمن استجابة وأخطاء quota قابلة للضبط"""
+import re
+import time
+import random
+import threading
+import collections
+import gspread
+
+_CELL = re.compile(r"^([A-Z]+)(\d*)$")
+
+
+def _col(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def _parse_range(range_name):
+    """'A5:E' -> (row1, col1, row2|None, col2)"""
+    range_name = range_name.split("!")[-1]
+    start, _, end = range_name.partition(":")
+    c1, r1 = _CELL.match(start).groups()
+    c2, r2 = _CELL.match(end or start).groups()
+    return int(r1 or 1), _col(c1), (int(r2) if r2 else None), _col(c2)
+
+
+class _Response:
+    def __init__(self, code, message):
+        self.status_code = code
+        self._body = {"error": {"code": code, "message": message, "status": "RESOURCE_EXHAUSTED"}}
+        self.text = message
+
+    def json(self):
+        return self._body
+
+
+class FakeSheetsService:
+    """
+    latency: ثواني لكل طلب
+    quota_error_rate: احتمال رد 429 لكل طلب
+    """
+
+    def __init__(self, latency=0.0, quota_error_rate=0.0, seed=None):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.random = random.Random(seed)
+        self.calls = collections.Counter()
+        self.spreadsheets = {}
+        self._lock = threading.Lock()
+
+    def request(self, op):
+        with self._lock:
+            self.calls[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota_error_rate and self.random.random() < self.quota_error_rate:
+            with self._lock:
+                self.calls["quota_errors"] += 1
+            raise gspread.exceptions.APIError(_Response(429, "Quota exceeded (fake)"))
+
+    @property
+    def total_calls(self):
+        return sum(v for k, v in self.calls.items() if k != "quota_errors")
+
+    def authorize(self):
+        return FakeClient(self)
+
+
+class FakeClient:
+    def __init__(self, service):
+        self.service = service
+
+    def open(self, name):
+        self.service.request("open")
+        if name not in self.service.spreadsheets:
+            raise gspread.SpreadsheetNotFound(name)
+        return self.service.spreadsheets[name]
+
+    def create(self, name):
+        self.service.request("create")
+        sheet = self.service.spreadsheets[name] = FakeSpreadsheet(self.service, name)
+        return sheet
+
+
+class FakeSpreadsheet:
+    def __init__(self, service, title):
+        self.service = service
+        self.title = title
+        self._worksheets = {}
+
+    def worksheets(self):
+        self.service.request("worksheets")
+        return list(self._worksheets.values())
+
+    def worksheet(self, title):
+        self.service.request("worksheet")
+        if title not in self._worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        self.service.request("add_worksheet")
+        ws = self._worksheets[title] = FakeWorksheet(self.service, title)
+        return ws
+
+
+class FakeWorksheet:
+    def __init__(self, service, title):
+        self.service = service
+        self.title = title
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def _range(self, row):
+        return f"{self.title}!A{row}:Z{row}"
+
+    # ===== القراءة =====
+    def get_values(self, range_name=None, **kwargs):
+        """مثل gspread: الصفوف الفارغة في النهاية تُحذف، والنطاق الفارغ = [[]]، والباقي يُكمل بـ ''"""
+        self.service.request("get_values")
+        with self._lock:
+            if range_name is None:
+                rows = [[str(v) for v in r] for r in self.rows]
+            else:
+                r1, c1, r2, c2 = _parse_range(range_name)
+                rows = [[str(v) for v in r[c1 - 1:c2]] for r in self.rows[r1 - 1:r2]]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        if not rows:
+            return [[]]
+        width = max(len(r) for r in rows)
+        return [r + [""] * (width - len(r)) for r in rows]
+
+    def get_all_records(self):
+        self.service.request("get_all_records")
+        with self._lock:
+            header, *rows = self.rows or [[]]
+            return [dict(zip(header, r)) for r in rows]
+
+    def row_values(self, row):
+        self.service.request("row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    # ===== الكتابة =====
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], op="append_row")
+
+    def append_rows(self, values, op="append_rows", **kwargs):
+        self.service.request(op)
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend([str(v) for v in row] for row in values)
+            return {"updates": {"updatedRange": f"{self.title}!A{first}:Z{len(self.rows)}"}}
+
+    def insert_row(self, values, index=1, **kwargs):
+        self.service.request("insert_row")
+        with self._lock:
+            self.rows.insert(index - 1, [str(v) for v in values])
+
+    def delete_rows(self, start, end=None):
+        self.service.request("delete_rows")
+        with self._lock:
+            del self.rows[start - 1:(end or start)]
+
+    def update(self, range_name, values, **kwargs):
+        self.service.request("update")
+        self._write(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self.service.request("batch_update")
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def _write(self, range_name, values):
+        r1, c1, _, _ = _parse_range(range_name)
+        with self._lock:
+            for i, row in enumerate(values):
+                while len(self.rows) < r1 + i:
+                    self.rows.append([])
+                target = self.rows[r1 - 1 + i]
+                for j, v in enumerate(row):
+                    while len(target) < c1 + j:
+                        target.append("")
+                    target[c1 - 1 + j] = str(v)
+
+    def clear(self):
+        self.service.request("clear")
+        with self._lock:
+            self.rows = []
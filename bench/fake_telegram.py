@@ -0,0 +1,104 @@
+"""خادم Bot API وهمي محلي يعيد ردوداً ناجحة بزمن استجابة وأخطاء 429 قابلة للضبط"""
+import time
+import random
+import socket
+import asyncio
+import threading
+import collections
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+class FakeTelegramServer:
+    """
+    latency: ثواني لكل طلب
+    flood_rate: احتمال رد 429 مع retry_after
+    """
+
+    def __init__(self, latency=0.0, flood_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = collections.Counter()
+        self.messages = 0
+        self.port = None
+        self._server = None
+        self._thread = None
+        self._message_id = 0
+        self._updates = []          # تحديثات تنتظر getUpdates
+        self._confirmed = 0         # آخر offset أرسله البوت
+        self._updates_lock = threading.Lock()
+        self.app = FastAPI()
+        self.app.post("/bot{token}/{method}")(self._handle)
+
+    async def _handle(self, token: str, method: str, request: Request):
+        payload = await request.json()
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return {"ok": True, "result": await self._get_updates(payload)}
+        if method == "deleteWebhook":
+            return {"ok": True, "result": True}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_rate and self.random.random() < self.flood_rate:
+            self.calls["429"] += 1
+            return {"ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}}
+        if method in ("sendMessage", "sendDocument", "sendVideo"):
+            self.messages += 1
+        elif method == "sendMediaGroup":
+            self.messages += len(payload.get("media", []))
+        self._message_id += 1
+        return {"ok": True, "result": {"message_id": self._message_id}}
+
+    # ===== long polling =====
+    def push_update(self, update):
+        with self._updates_lock:
+            self._updates.append(update)
+
+    @property
+    def pending_updates(self):
+        """تحديثات لم يؤكد البوت استلامها بعد"""
+        with self._updates_lock:
+            return sum(1 for u in self._updates if u["update_id"] >= self._confirmed)
+
+    async def _get_updates(self, payload):
+        offset = payload.get("offset") or 0
+        limit = payload.get("limit") or 100
+        deadline = time.monotonic() + min(payload.get("timeout") or 0, 5)
+        while True:
+            with self._updates_lock:
+                # offset يؤكد استلام كل ما قبله
+                self._confirmed = max(self._confirmed, offset)
+                self._updates = [u for u in self._updates if u["update_id"] >= self._confirmed]
+                batch = self._updates[:limit]
+            if batch or time.monotonic() >= deadline:
+                return batch
+            await asyncio.sleep(0.01)
+
+    @property
+    def total_calls(self):
+        return sum(v for k, v in self.calls.items() if k not in ("429", "getUpdates", "deleteWebhook"))
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="fake-telegram", daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
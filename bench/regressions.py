@@ -0,0 +1,231 @@
+"""
+فحوصات انحدار سريعة بدون شبكة (Google Sheets وهمي):
+    python -m bench.regressions
+"""
+import os
+import sys
+import time
+import tempfile
+import logging
+import threading
+
+WORKDIR = tempfile.mkdtemp(prefix="medbot-regressions-")
+# متغيرات البيئة يجب ضبطها قبل استيراد app.*
+os.environ["SHEETS_SCHEMA_CACHE"] = os.path.join(WORKDIR, "schema.json")
+os.environ["MATERIALS_FLUSH_SECONDS"] = "3600"
+os.environ["SHEETS_BACKOFF_BASE"] = "0.001"
+os.environ["SHEETS_BACKOFF_MAX"] = "0.01"
+
+from bench.fake_sheets import FakeSheetsService  # noqa: E402
+from app.cache import ReadCache  # noqa: E402
+from app.quota import CircuitBreaker  # noqa: E402
+from app.sheets import SheetsUnavailable  # noqa: E402
+from app.sheets_backend import SheetsBackend  # noqa: E402
+from app.sql_backend import SQLBackend  # noqa: E402
+
+CHECKS = []
+
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+
+def new_backend(service, name, lock=None):
+    return SheetsBackend(sheet_name="regressions", journal_path=os.path.join(WORKDIR, f"{name}.jsonl"),
+                         authorize=service.authorize, lock=lock)
+
+
+@check
+def journal_survives_restart():
+    """صفوف الـ journal التي لم تصل للورقة قبل التوقف تُكتب بعد إعادة التشغيل ولا تُحذف"""
+    service = FakeSheetsService()
+    first = new_backend(service, "restart")
+    first.init_db()
+    first.add_material("1", "Anatomy", "pdf", "in-sheet")
+    first.material_writer.flush()
+    first.add_materials([["1", "Anatomy", "pdf", "lost-1"], ["1", "Anatomy", "video", "lost-2"]])
+    # توقف مفاجئ: لا flush، الصفوف في الـ journal فقط
+
+    second = new_backend(service, "restart")
+    second.init_db()
+    pending = sorted(r[3] for r in second.material_writer.pending_rows())
+    assert pending == ["lost-1", "lost-2"], pending
+    assert [m["file_id"] for m in second.get_materials("1", "Anatomy", "pdf", use_cache=True)] \
+        == ["in-sheet", "lost-1"]
+    second.close()
+
+    third = new_backend(service, "restart")
+    third.init_db()
+    assert third.material_writer.pending_rows() == []
+    file_ids = sorted(r[3] for r in service.spreadsheets["regressions"].worksheet("materials").rows[1:])
+    assert file_ids == ["in-sheet", "lost-1", "lost-2"], file_ids
+    third.close()
+
+
+@check
+def incremental_refresh_sees_new_rows():
+    """تحديث لا يجد صفوفاً جديدة ([[]] من gspread) لا يتخطى الصف التالي المضاف للورقة"""
+    service = FakeSheetsService()
+    backend = new_backend(service, "refresh")
+    backend.init_db()
+    assert backend.catalog.refresh()
+    # صف أضافه عامل آخر أو أدمن يدوياً في الورقة
+    ws = service.spreadsheets["regressions"].worksheet("materials")
+    ws.append_rows([["1", "Anatomy", "pdf", "external", ""]])
+    backend.catalog.refresh()
+    file_ids = [m["file_id"] for m in backend.catalog.lookup("1", "Anatomy", "pdf")]
+    assert file_ids == ["external"], file_ids
+    backend.close()
+
+
+@check
+def sql_mirror_imports_sheet_additions():
+    """مع SHEETS_MIRROR: الصفوف المضافة في الورقة يدوياً تصل لقاعدة البيانات"""
+    service = FakeSheetsService()
+    mirror = new_backend(service, "mirror")
+    backend = SQLBackend("sqlite://", mirror=mirror, sync_interval=0.01)
+    backend.init_db()
+    backend.add_material("1", "Anatomy", "pdf", "from-bot")
+    mirror.material_writer.flush()
+
+    ws = service.spreadsheets["regressions"].worksheet("materials")
+    ws.append_rows([["1", "Anatomy", "pdf", "typed-in-sheet", ""]])
+    mirror.catalog.refresh_interval = 0
+    time.sleep(0.02)
+    backend.get_materials("1", "Anatomy", "pdf")
+    deadline = time.time() + 2
+    while backend._syncing:
+        assert time.time() < deadline, "mirror sync did not finish"
+        time.sleep(0.01)
+    file_ids = [m["file_id"] for m in backend.get_materials("1", "Anatomy", "pdf")]
+    assert file_ids == ["from-bot", "typed-in-sheet"], file_ids
+    backend.close()
+
+
+@check
+def sheets_io_goes_through_gateway():
+    """كل طلبات الورقة (حتى فتح المقابض وفحص الرؤوس) تمر عبر الحصة والدائرة"""
+    service = FakeSheetsService(quota_error_rate=1.0)
+    backend = new_backend(service, "gateway")
+    getattr(backend.materials_sheet, "get_values")
+    assert service.total_calls == 0, service.calls
+
+    try:
+        backend.init_db()
+    except Exception:
+        pass
+    else:
+        raise AssertionError("init_db should fail while Sheets is unavailable")
+    assert backend.handles.breaker.state == "open", backend.handles.breaker.state
+    calls = service.total_calls
+    try:
+        backend.check_schema()
+    except SheetsUnavailable:
+        pass
+    else:
+        raise AssertionError("check_schema should be rejected while the circuit is open")
+    assert service.total_calls == calls, service.calls
+
+    # لا نسخة من الفهرس: خطأ وليس قائمة فارغة، والخطأ لا يُخزن في الكاش
+    cache, loads = ReadCache(), []
+
+    def loader():
+        loads.append(1)
+        return backend.get_materials("1", "Anatomy", "pdf", use_cache=True)
+
+    for _ in range(2):
+        try:
+            cache.get_or_load("materials", loader)
+        except SheetsUnavailable:
+            pass
+        else:
+            raise AssertionError("expected SheetsUnavailable")
+    assert len(loads) == 2, loads
+    backend.close()
+
+
+@check
+def init_db_fails_until_loaded():
+    """init_db يرفع خطأ حتى يُحمّل الفهرس فعلاً، فلا يُعلن الإقلاع جاهزاً بفهرس فارغ"""
+    service = FakeSheetsService()
+    new_backend(service, "warmup").init_db()
+
+    service.quota_error_rate = 1.0
+    backend = new_backend(service, "warmup")
+    backend.handles.breaker = CircuitBreaker(reset_timeout=0)
+    try:
+        backend.init_db()
+    except Exception:
+        pass
+    else:
+        raise AssertionError("init_db should fail while Sheets is unavailable")
+    assert not backend.catalog.loaded
+
+    service.quota_error_rate = 0.0
+    backend.init_db()
+    assert backend.catalog.loaded and backend.waiting_store._loaded
+    backend.close()
+
+
+@check
+def breaker_probe_rejected_by_quota():
+    """الطلب التجريبي (half_open) الذي ترفضه الحصة لا يترك الدائرة معلقة"""
+    service = FakeSheetsService()
+    backend = new_backend(service, "probe")
+    backend.init_db()
+    breaker = backend.handles.breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    breaker.record_failure()
+    backend.handles.quota["read"].pause(60)
+    try:
+        backend.materials_sheet.get_values("A2:E")
+    except SheetsUnavailable:
+        pass
+    assert breaker.state != "half_open" and breaker.available, breaker.state
+
+    backend.handles.quota["read"].blocked_until = 0
+    backend.materials_sheet.get_values("A2:E")
+    assert breaker.state == "closed", breaker.state
+    backend.close()
+
+
+@check
+def lock_free_during_quota_wait():
+    """انتظار حصة الكتابة لا يمسك القفل العام (crud.LOCK)"""
+    lock = threading.Lock()
+    service = FakeSheetsService()
+    backend = new_backend(service, "lock", lock=lock)
+    backend.init_db()
+    backend.handles.quota["write"].pause(0.5)
+
+    writers = [
+        threading.Thread(target=backend._append_material_rows, args=([["1", "Anatomy", "pdf", "x", ""]],)),
+        threading.Thread(target=backend.set_waiting_file, args=(42, True)),
+    ]
+    for t in writers:
+        t.start()
+    time.sleep(0.1)
+    assert lock.acquire(timeout=0.05), "lock held while waiting for quota"
+    lock.release()
+    for t in writers:
+        t.join()
+    assert backend.get_waiting_file(42) is not None
+    backend.close()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    failed = 0
+    for fn in CHECKS:
+        try:
+            fn()
+        except Exception as e:
+            failed += 1
+            print(f"❌ {fn.__name__}: {type(e).__name__}: {e}")
+        else:
+            print(f"✅ {fn.__name__}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
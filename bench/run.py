@@ -0,0 +1,272 @@
+"""
+قياس أداء /webhook بدون إنترنت: خادم تلجرام وهمي + Google Sheets وهمي داخل الذاكرة
+
+أمثلة:
+    python -m bench.run --scenario students --students 200
+    python -m bench.run --scenario admin-upload --uploads 300 --backend sheets --sheets-latency 0.3
+    python -m bench.run --scenario students --backend sql --flood-rate 0.05 --json
+    python -m bench.run --scenario students --ingest polling
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+
+from bench.fake_telegram import FakeTelegramServer
+from bench.fake_sheets import FakeSheetsService
+
+ADMIN = {"id": 1, "username": "Mgdad_Ali"}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline webhook load test")
+    p.add_argument("--scenario", choices=["students", "admin-upload", "mixed"], default="students")
+    p.add_argument("--students", type=int, default=100, help="concurrent students navigating the menus")
+    p.add_argument("--uploads", type=int, default=100, help="files uploaded by the admin")
+    p.add_argument("--files-per-course", type=int, default=15, help="seeded materials per (semester, course, type)")
+    p.add_argument("--think-time", type=float, default=0.0, help="seconds between a student's taps")
+    p.add_argument("--backend", choices=["sheets", "sql"], default="sheets")
+    p.add_argument("--ingest", choices=["webhook", "polling"], default="webhook",
+                   help="deliver updates through /webhook or through getUpdates long polling")
+    p.add_argument("--sheets-latency", type=float, default=0.05)
+    p.add_argument("--quota-error-rate", type=float, default=0.0)
+    p.add_argument("--telegram-latency", type=float, default=0.02)
+    p.add_argument("--flood-rate", type=float, default=0.0, help="fraction of Telegram calls answered with 429")
+    p.add_argument("--global-rate", type=float, default=30.0)
+    p.add_argument("--chat-rate", type=float, default=1.0)
+    p.add_argument("--chat-burst", type=float, default=3.0)
+    p.add_argument("--timeout", type=float, default=600.0, help="max seconds to wait for the queues to drain")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    return p.parse_args(argv)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def configure_env(args, telegram, workdir):
+    """متغيرات البيئة يجب ضبطها قبل استيراد app.main"""
+    os.environ["BOT_TOKEN"] = "bench:token"
+    os.environ.pop("WEBHOOK_SECRET_TOKEN", None)
+    os.environ.pop("SESSION_DB", None)
+    os.environ["TELEGRAM_API_BASE"] = telegram.base_url
+    os.environ["TELEGRAM_GLOBAL_RATE"] = str(args.global_rate)
+    os.environ["TELEGRAM_CHAT_RATE"] = str(args.chat_rate)
+    os.environ["TELEGRAM_CHAT_BURST"] = str(args.chat_burst)
+    os.environ["MATERIALS_JOURNAL"] = os.path.join(workdir, "journal.jsonl")
+    os.environ["SHEETS_SCHEMA_CACHE"] = os.path.join(workdir, "schema.json")
+    # الاستيراد يتم دائماً بـ SQLite؛ في وضع sheets نستبدل الـ backend بعده
+    os.environ["DATABASE_URL"] = "sqlite://"
+
+
+def seed_rows(curriculum, files_per_course):
+    rows = []
+    for semester in curriculum.SEMESTERS:
+        for course in semester["courses"]:
+            for type_, _ in curriculum.CONTENT_TYPES:
+                for i in range(files_per_course):
+                    file_id = f"{semester['id']}-{course}-{type_}-{i}"
+                    rows.append([semester["id"], course, type_, file_id, "2024-01-01T00:00:00"])
+    return rows
+
+
+def build_backend(args, crud, sheets, workdir):
+    if args.backend == "sql":
+        return crud.backend
+    from app.sheets_backend import SheetsBackend
+    return SheetsBackend(lock=crud.LOCK, journal_path=os.path.join(workdir, "journal.jsonl"),
+                         authorize=sheets.authorize)
+
+
+def seed(args, crud, curriculum, sheets):
+    rows = seed_rows(curriculum, args.files_per_course)
+    if args.backend == "sql":
+        crud.backend._insert_materials(
+            [dict(zip(["semester", "course", "type", "file_id", "created_at"], r)) for r in rows])
+    else:
+        ws = crud.backend.handles.resolve("materials")
+        ws.rows.extend([list(map(str, r)) for r in rows])
+        crud.backend.catalog.refresh(full=True)
+    sheets.calls.clear()
+    return len(rows)
+
+
+def student_script(curriculum, keyboards, chat_id, n, paged=False):
+    """
+    تحديثات طالب واحد (بدون update_id)
+    paged: القائمة تُعرض على صفحات، فيضغط الطالب "إرسال الكل" لتصله الملفات
+    """
+    semester = curriculum.SEMESTERS[n % len(curriculum.SEMESTERS)]
+    course = semester["courses"][n % len(semester["courses"])]
+    type_ = curriculum.CONTENT_TYPES[n % len(curriculum.CONTENT_TYPES)][0]
+    user = {"id": chat_id, "username": f"student{n}"}
+    texts = ["/start", keyboards.BTN_START, semester["label"], course, curriculum.type_button(course, type_)]
+    updates = [{"message": {"chat": {"id": chat_id}, "from": user, "text": t}} for t in texts]
+    if paged:
+        updates.append({"callback_query": {
+            "id": f"cb-{chat_id}",
+            "from": user,
+            "message": {"message_id": n + 1, "chat": {"id": chat_id}},
+            "data": keyboards.encode_callback(keyboards.CB_ALL, semester["id"], course, type_),
+        }})
+    return updates
+
+
+def admin_script(curriculum, keyboards, chat_id, count):
+    updates = []
+    for i in range(count):
+        semester = curriculum.SEMESTERS[i % len(curriculum.SEMESTERS)]
+        course = semester["courses"][i % len(semester["courses"])]
+        is_video = i % 3 == 0
+        upload = {"chat": {"id": chat_id}, "from": ADMIN}
+        upload["video" if is_video else "document"] = {"file_id": f"upload-{i}"}
+        updates.append({"message": upload})
+        for text in (semester["label"], course,
+                     curriculum.type_button(course, "video" if is_video else "pdf")):
+            updates.append({"message": {"chat": {"id": chat_id}, "from": ADMIN, "text": text}})
+    return updates
+
+
+async def run(args):
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="medbot-bench-")
+    telegram = FakeTelegramServer(latency=args.telegram_latency, flood_rate=args.flood_rate,
+                                  seed=args.seed).start()
+    configure_env(args, telegram, workdir)
+    sheets = FakeSheetsService(latency=args.sheets_latency, seed=args.seed)
+
+    from app import main, crud, curriculum, keyboards, delivery
+    logging.getLogger().setLevel(logging.WARNING)
+
+    crud.backend = build_backend(args, crud, sheets, workdir)
+    await main.startup()
+    await main.wait_ready()
+    seeded = seed(args, crud, curriculum, sheets)
+    # أخطاء الـ quota أثناء الحمل فقط وليس أثناء التهيئة
+    sheets.quota_error_rate = args.quota_error_rate
+
+    # ===== قياس زمن المعالجة لكل تحديث =====
+    enqueued, processed = {}, []
+
+    async def timed_handler(update):
+        await main.process_update(update)
+        processed.append(time.perf_counter() - enqueued[update["update_id"]])
+
+    if args.ingest == "polling":
+        from app.polling import PollingRunner, OffsetStore
+        runner = PollingRunner(main.telegram, timed_handler, OffsetStore(os.path.join(workdir, "offset.json")),
+                               timeout=1)
+        polling = asyncio.get_running_loop().create_task(runner.run())
+        updates_pipeline = runner.pipeline
+    else:
+        main.pipeline._handler = timed_handler
+        updates_pipeline = main.pipeline
+
+    # ===== تيارات التحديثات =====
+    scripts = []
+    if args.scenario in ("students", "mixed"):
+        # أكثر من صفحة واحدة: الملفات لا تُرسل إلا بعد الضغط على "إرسال الكل"
+        paged = 0 < main.LISTING_PAGE_SIZE < args.files_per_course
+        scripts += [student_script(curriculum, keyboards, 100000 + n, n, paged) for n in range(args.students)]
+    if args.scenario in ("admin-upload", "mixed"):
+        scripts.append(admin_script(curriculum, keyboards, ADMIN["id"], args.uploads))
+
+    next_id = iter(range(1, 10 ** 9))
+    acks = []
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def play(script):
+            for item in script:
+                update = {"update_id": next(next_id), **item}
+                enqueued[update["update_id"]] = t0 = time.perf_counter()
+                if args.ingest == "polling":
+                    telegram.push_update(update)
+                else:
+                    r = await client.post("/webhook", json=update)
+                    if r.status_code != 200:
+                        print(f"webhook returned {r.status_code}", file=sys.stderr)
+                acks.append(time.perf_counter() - t0)
+                if args.think_time:
+                    await asyncio.sleep(args.think_time)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(play(s) for s in scripts))
+        accepted = time.perf_counter() - started
+
+        # انتظار انتهاء المعالجة والإرسال
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            if (telegram.pending_updates == 0 and updates_pipeline.pending == 0
+                    and main.scheduler.pending == 0
+                    and main.scheduler.in_flight == 0 and delivery.pending_deliveries() == 0):
+                break
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - started
+
+    if args.ingest == "polling":
+        runner.stop()
+        await polling
+    await main.shutdown()
+    telegram.stop()
+
+    updates = len(acks)
+    report = {
+        "scenario": args.scenario,
+        "backend": args.backend,
+        "ingest": args.ingest,
+        "updates": updates,
+        "seeded_materials": seeded,
+        "accept_seconds": round(accepted, 3),
+        "drain_seconds": round(drained, 3),
+        "throughput_updates_per_s": round(updates / drained, 2) if drained else 0,
+        "ack_ms": {"p50": round(percentile(acks, 50) * 1000, 2), "p99": round(percentile(acks, 99) * 1000, 2)},
+        "processing_ms": {"p50": round(percentile(processed, 50) * 1000, 2),
+                          "p99": round(percentile(processed, 99) * 1000, 2)},
+        "telegram": {"calls": telegram.total_calls, "calls_per_update": round(telegram.total_calls / updates, 3),
+                     "messages": telegram.messages, "by_method": dict(telegram.calls),
+                     "scheduler": dict(main.scheduler.stats)},
+        "sheets": {"calls": sheets.total_calls, "calls_per_update": round(sheets.total_calls / updates, 3),
+                   "by_op": dict(sheets.calls)} if args.backend == "sheets" else None,
+        "cache": crud.cache.stats(),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"scenario={report['scenario']} backend={report['backend']} ingest={report['ingest']} "
+          f"updates={report['updates']} "
+          f"seeded={report['seeded_materials']}")
+    print(f"  accepted in {report['accept_seconds']}s, drained in {report['drain_seconds']}s "
+          f"-> {report['throughput_updates_per_s']} updates/s")
+    print(f"  webhook ack     p50={report['ack_ms']['p50']}ms p99={report['ack_ms']['p99']}ms")
+    print(f"  processing      p50={report['processing_ms']['p50']}ms p99={report['processing_ms']['p99']}ms")
+    tg = report["telegram"]
+    print(f"  telegram calls  {tg['calls']} ({tg['calls_per_update']}/update), "
+          f"{tg['messages']} messages, {tg['by_method']}, scheduler={tg['scheduler']}")
+    if report["sheets"]:
+        sh = report["sheets"]
+        print(f"  sheets calls    {sh['calls']} ({sh['calls_per_update']}/update), {sh['by_op']}")
+    print(f"  cache           hit_ratio={report['cache']['hit_ratio']:.2f} {report['cache']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()